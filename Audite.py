@@ -46,6 +46,11 @@
          this sets tags: REPLAYGAIN_REFERENCE_LOUDNESS, REPLAYGAIN_TRACK_GAIN, REPLAYGAIN_TRACK_PEAK, REPLAYGAIN_ALBUM_GAIN, REPLAYGAIN_ALBUM_PEAK
      * MP3:  mp3gain -r -q -c -t *.mp3          # Apply to all tracks in album at once
          this modifies internal MP3 chunk volume scalers, without distorting the audiodata
+     If NumPy is available, Audite measures loudness of FLAC tracks itself (EBU R128 / ReplayGain 2.0, tracks in parallel)
+         and writes the same REPLAYGAIN_* tags within the single metadata rewrite instead of running 'metaflac',
+         MP3 tracks are always handed over to 'mp3gain'
+     Note that ReplayGain 2.0 gains differ from the ReplayGain 1.0 ones of 'metaflac' by a few dB, so they are told apart
+         by REPLAYGAIN_REFERENCE_LOUDNESS: '-18.00 LUFS' (built-in analysis) versus '89.0 dB' ('metaflac')
    8. Title formatting:
       It's a bit of mess here, better see 'coerceTitle(...)' function below. Some key ideas are listed below (8a, 8b).
    8a. Title formatting (English words):
@@ -107,6 +112,11 @@ def ShowHelp():
                         This option is useful e.g. for MP3 tracks which have already been replaygained
     --min-tracks=...  # Set the minimal count of audio files in a subfolder to be treated as album
                         This option is useful to make Audite skip small subfolders and do not check nor unify them
+    --jobs=...        # Analyse and coerce albums in N parallel processes (default: 1, 0 = all cores)
+    --no-cache        # Do not use the persistent scan cache (default: '~/.cache/audite/scan.sqlite')
+    --rebuild-cache   # Drop all the cached scan results and fill the scan cache anew
+    --incremental     # Report albums which were OK last time and have not changed since then as 'OK (cached)'
+                        This option is useful e.g. for regular checks of a large library (album collection mode only)
     --artist='...'    # Force the value of ARTIST tags in all audio files
     --album='...'     # Force the value of ALBUM tags in all audio files (allowed in '--single-album' mode only)
     --composer='...'  # Force the value of COMPOSER tags in all audio files (requires '--unify-composer' option)
@@ -125,11 +135,27 @@ def ShowHelp():
 
 import sys
 import os
+import io
+import shutil
+import tempfile
 import subprocess as proc
 from datetime import date
 import functools
-from difflib import SequenceMatcher
-import random
+import pickle
+import hashlib
+import mmap
+import zlib
+import sqlite3
+import contextlib
+import multiprocessing
+import concurrent.futures
+import threading
+import math
+import fractions
+try:
+    import numpy as np  # Optional, enables built-in FLAC ReplayGain analysis instead of 'metaflac'
+except ImportError:
+    np = None
 
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 # Global fields
@@ -141,6 +167,10 @@ MAX_TRACKS = 9999   # Per album
 DECAP_TABLE = ["a", "an", "the", "on", "in", "to", "onto", "into", "from", "with", "without", "for", "of", "and", "or", "nor", "not", "but", "yet", "as", "so", "feat", "featuring", "featured", "alt", "st", "nd", "rd", "th"]
 RECAP_TABLE = ["i", "my", "me", "you", "your", "yours", "she", "her", "hers", "he", "his", "him", "they", "their", "theirs", "them", "we", "our", "ours", "us", "be", "am", "is", "are", "were", "was", "go", "do", "don't" "does", "doesn't", "did", "didn't", "done", "deja", "vu", "mr", "ms", "mrs", "dr", "yes", "no", "oh", "ah", "eh", "uh", "na", "ni", "li", "pt", "ho", "wa", "wo", "ma", "ed", "op", "nr", "can", "can't", "ad"]
 UPPER_TABLE = ["ac/dc", "u2", "o2", "h2o", "co2", "sf", "ost", "dna", "t.n.t.", "tnt", "mtv", "s.o.s.", "sos", "i.r.s.", "r.i.p.", "rip", "i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x", "xi", "xii", "xiii", "xiv", "xv", "xvi", "xvii", "xviii", "xix", "xx", "xxi", "xxx", "mmxi", "mmxiv", "mcmxlv", "mcmlxxiv", "mmv", "cd", "ok", "bp", "sp", "t.v.", "uk", "u.k.", "usa", "tv", "fx", "xs", "sfso", "bbc", "htts", "jlt", "bwv", "bwu", "fff", "rpp", "b", "c", "d", "f", "g", "u", "r", "s", "y", "z", "nwobhm", "jfk", "gj", "aov"]
+# Frozen copies of the tables above for fast lookups
+DECAP_SET = frozenset(DECAP_TABLE)
+RECAP_SET = frozenset(RECAP_TABLE)
+UPPER_SET = frozenset(UPPER_TABLE)
 
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 # Global functions
@@ -153,6 +183,15 @@ def myCap(word: str):
         return word[0] + word[1:].capitalize()
 
 def coerceTitle(title: str):
+    return normalizeTitle(title, noCaps)
+
+def coerceTitles(titles):
+    # Batch version of 'coerceTitle', returns a list
+    return [normalizeTitle(title, noCaps) for title in titles]
+
+@functools.lru_cache(maxsize=1 << 16)
+def normalizeTitle(title: str, noCaps: bool):
+    # Memoized core of 'coerceTitle', the same strings come from file names, metadata and cuesheets over and over
     # Use triple dots
     pos = title.find("...")
     if pos >= 0:
@@ -187,11 +226,11 @@ def coerceTitle(title: str):
                 if len(wLow) == 0:
                     continue
             # Apply capitalization where needed
-            if wLow in DECAP_TABLE and not atSentStart:
+            if wLow in DECAP_SET and not atSentStart:
                 words[i] = word.lower()
-            elif wLow in RECAP_TABLE:
+            elif wLow in RECAP_SET:
                 words[i] = myCap(word)
-            elif wLow in UPPER_TABLE:
+            elif wLow in UPPER_SET:
                 words[i] = word.upper()
             elif len(wLow) <= 2 and not atSentStart:
                 words[i] = word.lower()
@@ -204,23 +243,23 @@ def ensureStringSafety(fName: str):
 
 def canBeAlbum(dName: str, *, insideComplex: bool = False):
     numTracks = 0
-    if os.path.isdir(dName):
-        baseDname = os.path.basename(dName)
-        if baseDname.find("- ") >= 0 or baseDname.find(". ") >= 0 or singleAlbum or insideComplex or "Misc" == baseDname or "Bonus CD" == baseDname: # Regular album must contain '-' in its dir name
-            for elem in os.listdir(dName):
-                fullPath = os.path.join(dName, elem)
-                if os.path.isfile(fullPath) and isAudioFile(elem):
+    baseDname = os.path.basename(dName)
+    if baseDname.find("- ") >= 0 or baseDname.find(". ") >= 0 or singleAlbum or insideComplex or "Misc" == baseDname or "Bonus CD" == baseDname: # Regular album must contain '-' in its dir name
+        listing = listDir(dName)
+        if listing != None:
+            for elem in listing.files:
+                if isAudioFile(elem):
                     numTracks += 1
     return numTracks >= minTracks
 
 def canBeComplexAlbum(dName: str):
     numAlbums = 0
-    if os.path.isdir(dName):
-        baseDname = os.path.basename(dName)
-        if baseDname.find("- ") > 0 or baseDname.find(". ") > 0 or singleAlbum or "Misc" == baseDname:  # Album must contain '-' in its dir name
-            for elem in os.listdir(dName):
-                fullPath = os.path.join(dName, elem)
-                if canBeAlbum(fullPath, insideComplex=True):
+    baseDname = os.path.basename(dName)
+    if baseDname.find("- ") > 0 or baseDname.find(". ") > 0 or singleAlbum or "Misc" == baseDname:  # Album must contain '-' in its dir name
+        listing = listDir(dName)
+        if listing != None:
+            for elem in listing.dirs:
+                if canBeAlbum(os.path.join(dName, elem), insideComplex=True):
                     numAlbums += 1
     return numAlbums >= 2
 
@@ -273,8 +312,192 @@ def nameCrit(strX: str):
 
     return -50
 
-def similar(strA: str, strB: str):
-    return SequenceMatcher(None, strA, strB).ratio()
+def trigrams(text: str):
+    # Character trigrams of padded lower-case text, the basis of fast fuzzy title comparison
+    text = "  " + text.lower() + " "
+    return frozenset(text[i:i+3] for i in range(len(text)-2))
+
+def similar(gramsA, gramsB):
+    # Dice coefficient of two trigram sets
+    if 0 == len(gramsA) + len(gramsB):
+        return 0.0
+    return 2.0 * len(gramsA & gramsB) / (len(gramsA) + len(gramsB))
+
+def similarMatrix(gramsA, gramsB):
+    # 'similar' for every pair of trigram sets from 'gramsA' (rows) and 'gramsB' (columns) at once, shared trigrams
+    # are counted as a product of 0/1 incidence matrices over the vocabulary of 'gramsB'
+    vocab = {}
+    for grams in gramsB:
+        for gram in grams:
+            vocab.setdefault(gram, len(vocab))
+    incidence = []
+    for gramSets in [gramsA, gramsB]:
+        matrix = np.zeros((len(gramSets), len(vocab)), dtype=np.float32)   # Counts stay exact far beyond title lengths
+        for row, grams in enumerate(gramSets):
+            matrix[row, [vocab[gram] for gram in grams if gram in vocab]] = 1.0
+        incidence.append(matrix)
+    shared = (incidence[0] @ incidence[1].T).astype(np.float64)
+    total = np.array([len(grams) for grams in gramsA], dtype=np.float64)[:, None] + np.array([len(grams) for grams in gramsB], dtype=np.float64)
+    return np.divide(2.0 * shared, total, out=np.zeros_like(total), where=total > 0)
+
+def solveAssignment(cost):
+    # Hungarian algorithm (shortest augmenting paths with potentials) for 'cost' matrix of n rows and m >= n columns,
+    # returns the column assigned to each row so that the total cost is minimal
+    n, m = len(cost), len(cost[0])
+    if np != None:
+        return solveAssignmentNp(np.asarray(cost, dtype=np.float64))
+    u = [0.0] * (n+1)
+    v = [0.0] * (m+1)
+    p = [0] * (m+1)     # Row assigned to column (1-based, zero if free)
+    way = [0] * (m+1)
+    for i in range(1, n+1):
+        p[0] = i
+        j0 = 0
+        minv = [math.inf] * (m+1)
+        used = [False] * (m+1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0-1]
+            ui0 = u[i0]
+            delta = math.inf
+            j1 = 0
+            for j in range(1, m+1):
+                if not used[j]:
+                    cur = row[j-1] - ui0 - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m+1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if 0 == p[j0]:
+                break
+        while j0 != 0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    result = [None] * n
+    for j in range(1, m+1):
+        if p[j] > 0:
+            result[p[j]-1] = j-1
+    return result
+
+def solveAssignmentNp(cost):
+    # The same algorithm as 'solveAssignment' with the scan over columns vectorised, ties are broken identically
+    n, m = cost.shape
+    u = np.zeros(n+1)
+    v = np.zeros(m+1)
+    p = np.zeros(m+1, dtype=np.int64)
+    way = np.zeros(m+1, dtype=np.int64)
+    for i in range(1, n+1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m+1, math.inf)
+        used = np.zeros(m+1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cur = cost[i0-1] - u[i0] - v[1:]
+            better = ~used[1:] & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            free = np.where(used[1:], math.inf, minv[1:])
+            j1 = int(np.argmin(free)) + 1
+            delta = free[j1-1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if 0 == p[j0]:
+                break
+        while j0 != 0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    result = [None] * n
+    for j in range(1, m+1):
+        if p[j] > 0:
+            result[p[j]-1] = j-1
+    return result
+
+def matchCueEntries(tracks, cueEntries):
+    # Assign cue entries to tracks (index or None per track) maximizing the total similarity of file names and metadata titles.
+    # Unambiguous exact title matches are settled right away, the rest is solved as an optimal assignment problem.
+    result = [None] * len(tracks)
+    cueLower = [cueTit.lower() for cueTit in cueEntries]
+    cueCount = {}
+    for cueLow in cueLower:
+        cueCount[cueLow] = cueCount.get(cueLow, 0) + 1
+    claims = {}
+    for trackInd, track in enumerate(tracks):
+        for title in [track.name.lower(), track.metaTitle.lower()]:
+            if 1 == cueCount.get(title, 0):
+                claims.setdefault(title, set()).add(trackInd)
+                break
+    for cueInd, cueLow in enumerate(cueLower):
+        if 1 == len(claims.get(cueLow, ())):
+            result[min(claims[cueLow])] = cueInd
+    # Score the remaining tracks against the remaining entries, only entries sharing some trigrams are compared at all
+    restTracks = [trackInd for trackInd in range(len(tracks)) if result[trackInd] is None]
+    restCues = sorted(set(range(len(cueEntries))) - set(result))
+    if 0 == len(restTracks) or 0 == len(restCues):
+        return result
+    cueGrams = [trigrams(cueEntries[cueInd]) for cueInd in restCues]
+    nameGrams = []
+    metaGrams = []
+    refNums = []
+    weights = []
+    for trackInd in restTracks:
+        track = tracks[trackInd]
+        nameGrams.append(trigrams(track.name) if len(track.name) > 0 else frozenset())
+        metaGrams.append(trigrams(track.metaTitle) if len(track.metaTitle) > 0 else frozenset())
+        # Costs (negative scores): penalty for number mismatch of non-ASCII names, natural order is preferred among equals
+        refNum, weight = 0, 0.0
+        if not track.name.isascii():
+            if track.number > 0:
+                refNum, weight = track.number, 2 / 4
+            elif track.metaNumber > 0:
+                refNum, weight = track.metaNumber, 1 / 4
+        refNums.append(refNum)
+        weights.append(weight)
+    if np != None:
+        # Whole cost matrix at once, large cuesheets with hundreds of entries take milliseconds
+        cueNums = np.array(restCues) + 1
+        checkNums = np.array([tracks[trackInd].checkNum for trackInd in restTracks])
+        scores = np.array(weights)[:, None] * (np.array(refNums)[:, None] - cueNums)**2 + 1.0e-6 * np.abs(checkNums[:, None] - cueNums)
+        scores -= 5 * similarMatrix(nameGrams, cueGrams) + 3 * similarMatrix(metaGrams, cueGrams)
+    else:
+        gramIndex = {}
+        for col, grams in enumerate(cueGrams):
+            for gram in grams:
+                gramIndex.setdefault(gram, []).append(col)
+        scores = []
+        for row, trackInd in enumerate(restTracks):
+            track = tracks[trackInd]
+            costs = [weights[row] * (refNums[row] - cueInd - 1)**2 + 1.0e-6 * abs(track.checkNum - cueInd - 1) for cueInd in restCues]
+            candidates = set()
+            for gram in nameGrams[row] | metaGrams[row]:
+                candidates.update(gramIndex.get(gram, []))
+            for col in candidates:
+                costs[col] -= 5 * similar(nameGrams[row], cueGrams[col]) + 3 * similar(metaGrams[row], cueGrams[col])
+            scores.append(costs)
+    # The assignment solver expects no more rows than columns
+    if len(restTracks) <= len(restCues):
+        for row, col in enumerate(solveAssignment(scores)):
+            result[restTracks[row]] = restCues[col]
+    else:
+        transposed = scores.T if np != None else [list(column) for column in zip(*scores)]
+        for col, row in enumerate(solveAssignment(transposed)):
+            result[restTracks[row]] = restCues[col]
+    return result
 
 def getCommonPrefPostFixes(strs):
     minLen = min([len(s) for s in strs])
@@ -296,14 +519,6 @@ def getCommonPrefPostFixes(strs):
             break
     return commPref, commPost
 
-def cutCueLine(line: str):
-    line = line.strip()
-    if '\r' == line[-1]:
-        line = line[:-1].rstrip()
-    if '"' == line[0]:
-        line = line[1:-1].strip()
-    return line
-
 def isStringSafe(fName: str):
     return fName.isprintable() and fName.find('/') < 0 and fName.find('\\') < 0 and fName.find(':') < 0
 
@@ -324,6 +539,1290 @@ def loadAndForceUTF8(fName: str):
         f.close()
     return text
 
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+# Directory index
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+class DirListing:
+
+    def __init__(self, dName):
+        # Define class fields
+        self.path = ""
+        self.names = []     # All entry names, sorted
+        self.dirs = []      # Subdirectory names, sorted
+        self.files = {}     # Regular file name -> identity tuple as returned by 'fileIdentity'
+        self.stats = {}     # Entry name -> (size, mtime) for every entry, subdirectories included
+
+        # Scan directory once, file type comes with the entry and every entry is stat'ed exactly once
+        self.path = dName
+        with os.scandir(dName) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue    # Broken symlink or vanished entry
+                self.names.append(entry.name)
+                self.stats[entry.name] = (st.st_size, st.st_mtime_ns)
+                if entry.is_dir():
+                    self.dirs.append(entry.name)
+                elif entry.is_file():
+                    self.files[entry.name] = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        self.names.sort()
+        self.dirs.sort()
+
+    def isFile(self, fName: str):
+        return fName in self.files
+
+    def fileSize(self, fName: str):
+        return self.files[fName][2]
+
+dirIndex = {}   # Directory path -> DirListing (None for non-directories), every directory is scanned once per process
+
+def listDir(dName: str):
+    if dName in dirIndex:
+        return dirIndex[dName]
+    try:
+        listing = DirListing(dName)
+    except OSError:
+        listing = None
+    dirIndex[dName] = listing
+    return listing
+
+def knownIdentity(fName: str):
+    # File identity from the directory index when the file has been listed already, saves a stat call
+    listing = dirIndex.get(os.path.dirname(fName))
+    if listing != None and os.path.basename(fName) in listing.files:
+        return listing.files[os.path.basename(fName)]
+    return fileIdentity(fName)
+
+def isKnownFile(fName: str):
+    listing = dirIndex.get(os.path.dirname(fName))
+    if listing != None:
+        return listing.isFile(os.path.basename(fName))
+    return os.path.isfile(fName)
+
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+# Cuesheets
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+class CueTrack:
+
+    def __init__(self):
+        self.strNumber = ""     # As written after TRACK
+        self.number = 0         # Zero unless numeric
+        self.title = None       # None if the track has no TITLE command
+        self.performer = ""
+        self.fileName = ""      # FILE the track belongs to
+        self.indexes = {}       # INDEX number -> 'mm:ss:ff'
+
+class CueSheet:
+
+    def __init__(self):
+        self.text = ""
+        self.header = {}        # Album-level commands before the first TRACK ('TITLE', 'PERFORMER', 'REM DATE', ...) -> value
+        self.files = []
+        self.tracks = []        # CueTrack objects in file order
+
+def cueValue(rest: str):
+    # Command argument with surrounding quotes removed, trailing words after the closing quote are dropped (FILE "..." WAVE)
+    rest = rest.strip()
+    if len(rest) > 0 and '"' == rest[0]:
+        end = rest.rfind('"')
+        return rest[1:end].strip() if end > 0 else rest[1:].strip()
+    return rest
+
+def parseCueSheet(text: str):
+    # Single pass over cuesheet lines, commands before the first TRACK belong to the album
+    cue = CueSheet()
+    cue.text = text
+    fileName = ""
+    track = None
+    for line in text.splitlines():
+        parts = line.split(None, 1)
+        if 0 == len(parts):
+            continue
+        command = parts[0].upper()
+        rest = parts[1] if len(parts) > 1 else ""
+        if "REM" == command:
+            parts = rest.split(None, 1)
+            if 0 == len(parts):
+                continue
+            command = "REM " + parts[0].upper()
+            rest = parts[1] if len(parts) > 1 else ""
+        if "FILE" == command:
+            fileName = cueValue(rest)
+            if '"' != rest.lstrip()[:1] and ' ' in fileName:
+                fileName = fileName.rsplit(None, 1)[0]  # Unquoted name followed by file type
+            cue.files.append(fileName)
+        elif "TRACK" == command:
+            track = CueTrack()
+            track.strNumber = rest.split()[0] if len(rest.split()) > 0 else ""
+            if track.strNumber.isnumeric():
+                track.number = int(track.strNumber)
+            track.fileName = fileName
+            cue.tracks.append(track)
+        elif track is None:
+            if not command in cue.header:
+                cue.header[command] = cueValue(rest)
+        elif "TITLE" == command:
+            if track.title is None:
+                track.title = cueValue(rest)
+        elif "PERFORMER" == command:
+            track.performer = cueValue(rest)
+        elif "INDEX" == command:
+            parts = rest.split(None, 1)
+            if 2 == len(parts) and parts[0].isnumeric() and not int(parts[0]) in track.indexes:
+                track.indexes[int(parts[0])] = cueValue(parts[1])
+    return cue
+
+def cueTitleFromFileName(fileName: str):
+    # Title and number (None if absent) of FILE entry like '##. Title.flac', useful when track TITLE is missing
+    numAndTitle = os.path.basename(fileName).strip()
+    dotPos = numAndTitle.rfind('.')
+    if dotPos > 0:
+        numAndTitle = numAndTitle[:dotPos].rstrip()
+    namePos = 0
+    while namePos < len(numAndTitle) and numAndTitle[namePos].isdigit():
+        namePos += 1
+    if 0 < namePos < len(numAndTitle) and (numAndTitle[namePos] in ['.','-',' '] or namePos < len(numAndTitle)/3.0):
+        title = numAndTitle[namePos:].lstrip()
+        if len(title) > 0 and title[0] in ['.','-']:
+            title = title[1:].lstrip()
+        return title, int(numAndTitle[:namePos])
+    return numAndTitle, None
+
+cueSheetCache = {}  # Cuesheet path -> (file identity, CueSheet), parsed once per process
+
+def loadCueSheet(cuePath: str):
+    cached = cueSheetCache.get(cuePath)
+    if cached != None and cached[0] == fileIdentity(cuePath):
+        return cached[1]
+    cue = parseCueSheet(loadAndForceUTF8(cuePath))     # Might reencode the file, so take its identity afterwards
+    cueSheetCache[cuePath] = (fileIdentity(cuePath), cue)
+    return cue
+
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+# Metadata readers (in-process, header-only)
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+PROBE_HEAD_SIZE = 16384     # Leading bytes of audio file read at once by 'sniffAudioFile'
+
+class HeadFile:
+
+    # Read-only file object which serves already known leading bytes from memory and opens the file only when needed
+    def __init__(self, fName, head: bytes = b''):
+        self.fName = fName
+        self.head = head
+        self.pos = 0
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+    def diskFile(self):
+        if self.file == None:
+            self.file = open(self.fName, 'rb')
+        return self.file
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if os.SEEK_CUR == whence:
+            offset += self.pos
+        elif os.SEEK_END == whence:
+            offset += os.path.getsize(self.fName)
+        self.pos = max(offset, 0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, size=-1):
+        end = len(self.head)
+        if 0 <= size and self.pos + size <= end:
+            data = self.head[self.pos:self.pos+size]
+        else:
+            f = self.diskFile()
+            f.seek(self.pos)
+            data = f.read(size)
+        self.pos += len(data)
+        return data
+
+FLAC_STREAMINFO = 0
+FLAC_PADDING = 1
+FLAC_APPLICATION = 2
+FLAC_SEEKTABLE = 3
+FLAC_VORBIS_COMMENT = 4
+FLAC_CUESHEET = 5
+FLAC_PICTURE = 6
+
+class EmbeddedPicture:
+
+    def __init__(self):
+        self.picType = 0        # 3 stands for 'Cover (front)'
+        self.mime = ""
+        self.description = ""
+        self.width = 0
+        self.height = 0
+        self.depth = 0
+        self.colors = 0
+        self.dataOffset = 0     # Absolute position of image data within the audio file
+        self.dataLength = 0
+        self.digest = b''       # Digest of image data, taken by 'probeTrackFile' for the first picture and kept in scan cache
+
+def digestFileRange(fName: str, offset: int, length: int):
+    # Fast digest of 'length' bytes at 'offset' read through a memory map, empty when the range is unavailable
+    if offset < 0 or length <= 0:
+        return b''
+    try:
+        with open(fName, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if offset + length > len(mm):
+                    return b''
+                with memoryview(mm) as view, view[offset:offset+length] as part:
+                    return hashlib.blake2b(part, digest_size=16).digest()
+    except (OSError, ValueError):
+        return b''
+
+class FlacMeta:
+
+    def __init__(self):
+        self.minBlockSize = 0
+        self.maxBlockSize = 0
+        self.sampleRate = 0
+        self.channels = 0
+        self.bitsPerSample = 0
+        self.totalSamples = 0
+        self.md5 = b''
+        #
+        self.vendor = ""
+        self.comments = []      # (name, value) pairs of Vorbis comment in file order
+        self.tags = {}          # Upper-case tag name -> list of values (in file order)
+        self.pictures = []      # EmbeddedPicture objects
+        self.seekPoints = 0
+        self.applications = []  # Application IDs
+        self.paddings = []      # Lengths of PADDING blocks
+        #
+        self.blocks = []        # (type, data offset, data length) for every metadata block
+        self.flacOffset = 0     # Position of 'fLaC' marker (non-zero when ID3v2 is prepended)
+        self.audioOffset = 0    # Position of the first audio frame
+
+    def countBlocks(self, blockType):
+        return sum(1 for b in self.blocks if b[0] == blockType)
+
+def parseVorbisComment(data: bytes):
+    comments = []
+    vendorLen = int.from_bytes(data[0:4], 'little')
+    vendor = data[4:4+vendorLen].decode('utf-8', 'replace')
+    pos = 4 + vendorLen
+    count = int.from_bytes(data[pos:pos+4], 'little')
+    pos += 4
+    for i in range(count):
+        if pos+4 > len(data):
+            break
+        entryLen = int.from_bytes(data[pos:pos+4], 'little')
+        entry = data[pos+4:pos+4+entryLen].decode('utf-8', 'replace')
+        pos += 4 + entryLen
+        eqPos = entry.find('=')
+        if eqPos <= 0:
+            continue
+        comments.append((entry[:eqPos], entry[eqPos+1:]))
+    return vendor, comments
+
+def buildVorbisComment(vendor: str, comments):
+    rawVendor = vendor.encode('utf-8')
+    data = len(rawVendor).to_bytes(4, 'little') + rawVendor + len(comments).to_bytes(4, 'little')
+    for name, value in comments:
+        entry = (name + '=' + value).encode('utf-8')
+        data += len(entry).to_bytes(4, 'little') + entry
+    return data
+
+def readFlacMeta(fName: str, head: bytes = b''):
+    meta = FlacMeta()
+    with HeadFile(fName, head) as f:
+        head = f.read(10)
+        # Skip ID3v2 tag which is occasionally prepended to FLAC files
+        if head[:3] == b'ID3' and len(head) == 10:
+            meta.flacOffset = 10 + ((head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | (head[9] & 0x7f))
+            if head[5] & 0x10:
+                meta.flacOffset += 10   # ID3v2.4 footer
+            f.seek(meta.flacOffset)
+            head = f.read(4)
+        if head[:4] != b'fLaC':
+            return None
+        pos = meta.flacOffset + 4
+        isLast = False
+        while not isLast:
+            f.seek(pos)
+            blockHead = f.read(4)
+            if len(blockHead) < 4:
+                return None     # Truncated metadata
+            isLast = (blockHead[0] & 0x80) != 0
+            blockType = blockHead[0] & 0x7f
+            blockLen = int.from_bytes(blockHead[1:4], 'big')
+            pos += 4
+            meta.blocks.append((blockType, pos, blockLen))
+            if FLAC_STREAMINFO == blockType:
+                data = f.read(blockLen)
+                if len(data) < 34:
+                    return None
+                meta.minBlockSize = int.from_bytes(data[0:2], 'big')
+                meta.maxBlockSize = int.from_bytes(data[2:4], 'big')
+                bits = int.from_bytes(data[10:18], 'big')
+                meta.sampleRate = bits >> 44
+                meta.channels = ((bits >> 41) & 0x07) + 1
+                meta.bitsPerSample = ((bits >> 36) & 0x1f) + 1
+                meta.totalSamples = bits & 0xfffffffff
+                meta.md5 = data[18:34]
+            elif FLAC_VORBIS_COMMENT == blockType:
+                meta.vendor, meta.comments = parseVorbisComment(f.read(blockLen))
+                for name, value in meta.comments:
+                    meta.tags.setdefault(name.upper(), []).append(value)
+            elif FLAC_PICTURE == blockType:
+                # Read picture header only, image data itself is skipped
+                pic = EmbeddedPicture()
+                pic.picType = int.from_bytes(f.read(4), 'big')
+                mimeLen = int.from_bytes(f.read(4), 'big')
+                pic.mime = f.read(mimeLen).decode('ascii', 'replace')
+                descLen = int.from_bytes(f.read(4), 'big')
+                pic.description = f.read(descLen).decode('utf-8', 'replace')
+                fields = f.read(20)
+                pic.width = int.from_bytes(fields[0:4], 'big')
+                pic.height = int.from_bytes(fields[4:8], 'big')
+                pic.depth = int.from_bytes(fields[8:12], 'big')
+                pic.colors = int.from_bytes(fields[12:16], 'big')
+                pic.dataLength = int.from_bytes(fields[16:20], 'big')
+                pic.dataOffset = pos + 32 + mimeLen + descLen
+                meta.pictures.append(pic)
+            elif FLAC_SEEKTABLE == blockType:
+                meta.seekPoints = blockLen // 18
+            elif FLAC_APPLICATION == blockType:
+                meta.applications.append(f.read(4).decode('ascii', 'replace'))
+            elif FLAC_PADDING == blockType:
+                meta.paddings.append(blockLen)
+            pos += blockLen
+        meta.audioOffset = pos
+    if len(meta.blocks) == 0 or FLAC_STREAMINFO != meta.blocks[0][0]:
+        return None
+    return meta
+
+def buildFlacPicture(imgFormat: str, width: int, height: int, imgData: bytes):
+    # PICTURE block payload equivalent to 'metaflac --import-picture-from=...' with default specification
+    mime = ("image/" + imgFormat).encode('ascii')
+    data = (3).to_bytes(4, 'big') + len(mime).to_bytes(4, 'big') + mime + (0).to_bytes(4, 'big')
+    data += width.to_bytes(4, 'big') + height.to_bytes(4, 'big') + (24).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+    data += len(imgData).to_bytes(4, 'big') + imgData
+    return data
+
+def rewriteFlacMeta(fName: str, meta: FlacMeta, comments, dropTypes, newPictures):
+    # Write the whole new metadata chain followed by untouched audio frames into a temporary file, then replace
+    # the original one at once. Blocks of 'dropTypes' are omitted, 'newPictures' are appended as PICTURE blocks.
+    with open(fName, 'rb') as src:
+        prefix = src.read(meta.flacOffset)  # Keep prepended ID3v2 tag (if any) intact
+        blocks = []
+        hasComment = False
+        for blockType, offset, length in meta.blocks:
+            if blockType in dropTypes:
+                continue
+            if FLAC_VORBIS_COMMENT == blockType:
+                if hasComment:
+                    continue    # Only one VORBIS_COMMENT block is allowed
+                hasComment = True
+                data = buildVorbisComment(meta.vendor, comments)
+            else:
+                src.seek(offset)
+                data = src.read(length)
+            blocks.append((blockType, data))
+        if not hasComment:
+            blocks.insert(1, (FLAC_VORBIS_COMMENT, buildVorbisComment(meta.vendor, comments)))
+        for pic in newPictures:
+            blocks.append((FLAC_PICTURE, pic))
+        # Serialize the new chain
+        chain = prefix + b'fLaC'
+        for i, (blockType, data) in enumerate(blocks):
+            assert len(data) < (1 << 24)
+            lastFlag = 0x80 if i == len(blocks)-1 else 0
+            chain += bytes([lastFlag | blockType]) + len(data).to_bytes(3, 'big') + data
+        # Temporary file name is short, since audio file names may already come close to NAME_MAX
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fName)), prefix=".audite-")
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                dst.write(chain)
+                src.seek(meta.audioOffset)
+                shutil.copyfileobj(src, dst, 1 << 20)
+                dst.flush()
+                os.fsync(dst.fileno())
+            shutil.copymode(fName, tmpPath)
+        except:
+            if os.path.isfile(tmpPath):
+                os.remove(tmpPath)
+            raise
+    os.replace(tmpPath, fName)
+
+ID3V1_GENRES = ["Blues", "Classic Rock", "Country", "Dance", "Disco", "Funk", "Grunge", "Hip-Hop", "Jazz", "Metal", "New Age", "Oldies", "Other", "Pop", "R&B", "Rap", "Reggae", "Rock", "Techno", "Industrial", \
+                "Alternative", "Ska", "Death Metal", "Pranks", "Soundtrack", "Euro-Techno", "Ambient", "Trip-Hop", "Vocal", "Jazz+Funk", "Fusion", "Trance", "Classical", "Instrumental", "Acid", "House", "Game", "Sound Clip", "Gospel", "Noise", \
+                "Alternative Rock", "Bass", "Soul", "Punk", "Space", "Meditative", "Instrumental Pop", "Instrumental Rock", "Ethnic", "Gothic", "Darkwave", "Techno-Industrial", "Electronic", "Pop-Folk", "Eurodance", "Dream", "Southern Rock", "Comedy", "Cult", "Gangsta Rap", \
+                "Top 40", "Christian Rap", "Pop/Funk", "Jungle", "Native American", "Cabaret", "New Wave", "Psychedelic", "Rave", "Showtunes", "Trailer", "Lo-Fi", "Tribal", "Acid Punk", "Acid Jazz", "Polka", "Retro", "Musical", "Rock & Roll", "Hard Rock", \
+                "Folk", "Folk-Rock", "National Folk", "Swing", "Fast-Fusion", "Bebop", "Latin", "Revival", "Celtic", "Bluegrass", "Avantgarde", "Gothic Rock", "Progressive Rock", "Psychedelic Rock", "Symphonic Rock", "Slow Rock", "Big Band", "Chorus", "Easy Listening", "Acoustic", \
+                "Humour", "Speech", "Chanson", "Opera", "Chamber Music", "Sonata", "Symphony", "Booty Bass", "Primus", "Porn Groove", "Satire", "Slow Jam", "Club", "Tango", "Samba", "Folklore", "Ballad", "Power Ballad", "Rhythmic Soul", "Freestyle", \
+                "Duet", "Punk Rock", "Drum Solo", "A Cappella", "Euro-House", "Dance Hall", "Goa", "Drum & Bass", "Club-House", "Hardcore", "Terror", "Indie", "BritPop", "Afro-Punk", "Polsk Punk", "Beat", "Christian Gangsta Rap", "Heavy Metal", "Black Metal", "Crossover", \
+                "Contemporary Christian", "Christian Rock", "Merengue", "Salsa", "Thrash Metal", "Anime", "JPop", "Synthpop"]
+ID3V22_FRAMES = {"BUF": "RBUF", "CNT": "PCNT", "COM": "COMM", "CRA": "AENC", "ETC": "ETCO", "EQU": "EQUA", "GEO": "GEOB", "IPL": "TIPL", \
+                 "MCI": "MCDI", "MLL": "MLLT", "PIC": "APIC", "POP": "POPM", "REV": "RVRB", "RVA": "RVAD", "SLT": "SYLT", "STC": "SYTC", \
+                 "TAL": "TALB", "TBP": "TBPM", "TCM": "TCOM", "TCO": "TCON", "TCR": "TCOP", "TDA": "TDAT", "TDY": "TDLY", "TEN": "TENC", \
+                 "TFT": "TFLT", "TIM": "TIME", "TKE": "TKEY", "TLA": "TLAN", "TLE": "TLEN", "TMT": "TMED", "TOA": "TOPE", "TOF": "TOFN", \
+                 "TOL": "TOLY", "TOR": "TDOR", "TOT": "TOAL", "TP1": "TPE1", "TP2": "TPE2", "TP3": "TPE3", "TP4": "TPE4", "TPA": "TPOS", \
+                 "TPB": "TPUB", "TRC": "TSRC", "TRD": "TRDA", "TRK": "TRCK", "TSI": "TSIZ", "TSS": "TSSE", "TT1": "TIT1", "TT2": "TIT2", \
+                 "TT3": "TIT3", "TXT": "TEXT", "TXX": "TXXX", "TYE": "TDRC", "UFI": "UFID", "ULT": "USLT", "WAF": "WOAF", "WAR": "WOAR", \
+                 "WAS": "WOAS", "WCM": "WCOM", "WCP": "WCOP", "WPB": "WPUB", "WXX": "WXXX", \
+                 "TCP": "TCMP", "TST": "TSOT", "TSP": "TSOP", "TSA": "TSOA", "TS2": "TSO2", "TSC": "TSOC"}     # The last row: iTunes extensions
+ID3V23_RENAMES = {"TYER": "TDRC", "TORY": "TDOR", "IPLS": "TIPL"}
+ID3V23_OBSOLETE = ["TDAT", "TIME", "TRDA", "TSIZ"]     # Frames which have no place in ID3v2.4
+ID3_ENCODINGS = ["latin-1", "utf-16", "utf-16-be", "utf-8"]
+
+class Id3Meta:
+
+    def __init__(self):
+        self.version = 0        # Major version of ID3v2 tag (2, 3 or 4), zero if absent
+        self.tagSize = 0        # Full size of ID3v2 tag including header (and footer)
+        self.paddingSize = 0    # Trailing zero bytes available within ID3v2 tag
+        self.frames = {}        # Frame ID (ID3v2.4 naming, 'TXXX:DESC' for user frames) -> list of text values
+        self.pictures = []      # EmbeddedPicture objects from APIC frames
+        self.rawFrames = []     # (frame ID, decoded frame body) pairs in file order, ID3v2.4-compatible
+        self.unsupported = []   # IDs of frames which cannot be carried over into ID3v2.4 (encrypted, unknown ID3v2.2 ones)
+        self.hasV1 = False
+        self.apeItems = {}      # APEv2 tag items (upper-case key -> text), e.g. MP3GAIN_* state written by 'mp3gain'
+        self.audioOffset = 0    # Position of the first byte after ID3v2 tag
+
+def syncsafeInt(data: bytes):
+    value = 0
+    for b in data:
+        value = (value << 7) | (b & 0x7f)
+    return value
+
+def splitEncodedText(data: bytes, enc: int):
+    # Split 'data' into the first encoded null-terminated string and the rest
+    term = b'\0\0' if enc in [1, 2] else b'\0'
+    pos = 0
+    while True:
+        pos = data.find(term, pos)
+        if pos < 0:
+            return data.decode(ID3_ENCODINGS[enc], 'replace'), b''
+        if len(term) == 1 or pos % 2 == 0:
+            return data[:pos].decode(ID3_ENCODINGS[enc], 'replace'), data[pos+len(term):]
+        pos += 1
+
+def decodeId3Genre(value: str):
+    # Translate ID3v1-style numeric references like '(17)' or '17' into genre names
+    value = value.strip()
+    if value.isdigit() and int(value) < len(ID3V1_GENRES):
+        return ID3V1_GENRES[int(value)]
+    if value.startswith('(') and value.find(')') > 1:
+        end = value.find(')')
+        ref = value[1:end]
+        rest = value[end+1:].strip()
+        if len(rest) > 0:
+            return rest
+        if ref.isdigit() and int(ref) < len(ID3V1_GENRES):
+            return ID3V1_GENRES[int(ref)]
+        if "RX" == ref:
+            return "Remix"
+        if "CR" == ref:
+            return "Cover"
+    return value
+
+JPEG_ZIGZAG = [0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5, 12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28, \
+               35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51, 58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63]
+JPEG_STD_LUMA = [16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55, 14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62, \
+                 18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92, 49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99]
+JPEG_STD_LUMA_ZIGZAG = [JPEG_STD_LUMA[i] for i in JPEG_ZIGZAG]   # DQT segments store tables in zigzag order
+
+def estimateJpegQuality(table):
+    # Find the libjpeg quality setting whose scaled standard luminance table fits 'table' best
+    bestQuality = 0
+    bestDiff = -1
+    for q in range(1, 101):
+        scale = 5000 // q if q < 50 else 200 - 2*q
+        diff = 0
+        for std, val in zip(JPEG_STD_LUMA_ZIGZAG, table):
+            diff += abs(min(max((std*scale + 50) // 100, 1), 255) - val)
+        if diff < bestDiff or bestDiff < 0:
+            bestDiff = diff
+            bestQuality = q
+    return bestQuality
+
+def probeImage(f):
+    # Returns (format, width, height, quality) reading image headers only, quality is zero if unknown
+    head = f.read(32)
+    if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+        return "png", int.from_bytes(head[16:20], 'big'), int.from_bytes(head[20:24], 'big'), 0
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        chunk = head[12:16]
+        if b'VP8 ' == chunk and head[23:26] == b'\x9d\x01\x2a':
+            return "webp", int.from_bytes(head[26:28], 'little') & 0x3fff, int.from_bytes(head[28:30], 'little') & 0x3fff, 0
+        if b'VP8L' == chunk and 0x2f == head[20]:
+            bits = int.from_bytes(head[21:25], 'little')
+            return "webp", (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1, 0
+        if b'VP8X' == chunk:
+            return "webp", int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1, 0
+        return "webp", 0, 0, 0
+    if head[:2] == b'BM' and len(head) >= 26:
+        if 12 == int.from_bytes(head[14:18], 'little'):
+            return "bmp", int.from_bytes(head[18:20], 'little'), int.from_bytes(head[20:22], 'little'), 0
+        return "bmp", abs(int.from_bytes(head[18:22], 'little', signed=True)), abs(int.from_bytes(head[22:26], 'little', signed=True)), 0
+    if head[:2] != b'\xff\xd8':
+        return "", 0, 0, 0
+    # Walk JPEG markers up to the start of scan
+    width = 0
+    height = 0
+    quality = 0
+    pos = 2
+    while True:
+        f.seek(pos)
+        marker = f.read(4)
+        if len(marker) < 4 or marker[0] != 0xff:
+            break
+        if 0xff == marker[1]:
+            pos += 1    # Fill byte
+            continue
+        if marker[1] in [0x01, 0xd8] or 0xd0 <= marker[1] <= 0xd7:
+            pos += 2    # Standalone marker
+            continue
+        if marker[1] in [0xd9, 0xda]:
+            break
+        segLen = int.from_bytes(marker[2:4], 'big')
+        if 0xc0 <= marker[1] <= 0xcf and marker[1] not in [0xc4, 0xc8, 0xcc]:
+            frame = f.read(5)
+            if len(frame) == 5:
+                height = int.from_bytes(frame[1:3], 'big')
+                width = int.from_bytes(frame[3:5], 'big')
+        elif 0xdb == marker[1] and 0 == quality:
+            # Quantization tables, the first (luminance) one defines quality estimate
+            dqt = f.read(segLen - 2)
+            if len(dqt) >= 65:
+                if dqt[0] >> 4:
+                    table = [int.from_bytes(dqt[1+2*i:3+2*i], 'big') for i in range(64)]    # 16-bit precision
+                else:
+                    table = list(dqt[1:65])
+                quality = estimateJpegQuality(table)
+        if width > 0 and quality > 0:
+            break
+        pos += 2 + segLen
+    return "jpeg", width, height, quality
+
+def imageDimensions(data: bytes):
+    # Width and height of an image from its leading bytes, (0, 0) if unknown
+    fmt, width, height, quality = probeImage(io.BytesIO(data))
+    return width, height
+
+def parseId3Frames(meta: Id3Meta, data: bytes, version: int, tagUnsync: bool, dataPos: int):
+    pos = 0
+    idLen = 3 if 2 == version else 4
+    headLen = 6 if 2 == version else 10
+    while pos + headLen <= len(data):
+        frameId = data[pos:pos+idLen].decode('latin-1')
+        if not (frameId.isalnum() and frameId.isupper() or frameId.isdigit()) or data[pos] == 0:
+            break   # Padding reached
+        if 2 == version:
+            frameLen = int.from_bytes(data[pos+3:pos+6], 'big')
+            flags = 0
+        elif 4 == version:
+            frameLen = syncsafeInt(data[pos+4:pos+8])
+            flags = int.from_bytes(data[pos+8:pos+10], 'big')
+        else:
+            frameLen = int.from_bytes(data[pos+4:pos+8], 'big')
+            flags = int.from_bytes(data[pos+8:pos+10], 'big')
+        body = data[pos+headLen:pos+headLen+frameLen]
+        bodyPos = dataPos + pos + headLen
+        pos += headLen + frameLen
+        # Deal with frame format flags
+        exactOffsets = not tagUnsync
+        if 2 == version:
+            if not frameId in ID3V22_FRAMES:
+                meta.unsupported.append(frameId)    # E.g. 'LNK' and 'CRM' have no ID3v2.4 counterpart of the same layout
+                continue
+            frameId = ID3V22_FRAMES[frameId]
+        elif 4 == version:
+            if flags & 0x0004:
+                meta.unsupported.append(frameId)    # Encrypted frame
+                continue
+            if flags & 0x0040:
+                body = body[1:]     # Grouping identity
+                bodyPos += 1
+            if flags & 0x0001:
+                body = body[4:]     # Data length indicator
+                bodyPos += 4
+            if flags & 0x0002:
+                body = body.replace(b'\xff\x00', b'\xff')
+                exactOffsets = False
+        elif 3 == version:
+            if flags & 0x0040:
+                meta.unsupported.append(frameId)    # Encrypted frame
+                continue
+            extra = (4 if flags & 0x0080 else 0) + (1 if flags & 0x0020 else 0)    # Decompressed size, grouping identity
+            body = body[extra:]
+            bodyPos += extra
+        if flags & (0x0008 if 4 == version else 0x0080):
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                meta.unsupported.append(frameId)
+                continue
+            exactOffsets = False
+        if len(body) == 0:
+            continue
+        frameId = ID3V23_RENAMES.get(frameId, frameId)
+        # Keep frame body in ID3v2.4-compatible form for later rewriting
+        if "APIC" == frameId and 2 == version:
+            imgFmt = body[1:4].decode('latin-1').upper()
+            mime = {"JPG": "image/jpeg", "PNG": "image/png"}.get(imgFmt, "image/"+imgFmt.lower())
+            meta.rawFrames.append((frameId, body[0:1] + mime.encode('latin-1') + b'\0' + body[4:]))
+        elif 4 == len(frameId) and not frameId in ID3V23_OBSOLETE:
+            meta.rawFrames.append((frameId, body))
+        if "APIC" == frameId:
+            enc = body[0] if body[0] < 4 else 0
+            pic = EmbeddedPicture()
+            if 2 == version:
+                imgFmt = body[1:4].decode('latin-1').upper()
+                pic.mime = {"JPG": "image/jpeg", "PNG": "image/png"}.get(imgFmt, "image/"+imgFmt.lower())
+                rest = body[4:]
+            else:
+                end = body.find(b'\0', 1)
+                if end < 0:
+                    continue
+                pic.mime = body[1:end].decode('latin-1')
+                rest = body[end+1:]
+            if len(rest) == 0:
+                continue
+            pic.picType = rest[0]
+            pic.description, imgData = splitEncodedText(rest[1:], enc)
+            pic.dataLength = len(imgData)
+            pic.dataOffset = bodyPos + len(body) - len(imgData) if exactOffsets else -1
+            pic.width, pic.height = imageDimensions(imgData[:65536])
+            meta.pictures.append(pic)
+            meta.frames.setdefault("APIC", []).append(pic.description)
+        elif "TXXX" == frameId:
+            enc = body[0] if body[0] < 4 else 0
+            desc, value = splitEncodedText(body[1:], enc)
+            values = [v for v in value.decode(ID3_ENCODINGS[enc], 'replace').split('\0') if len(v) > 0]
+            meta.frames.setdefault("TXXX:"+desc.upper(), []).extend(values)
+        elif frameId[0] == 'T':
+            enc = body[0] if body[0] < 4 else 0
+            values = [v for v in body[1:].decode(ID3_ENCODINGS[enc], 'replace').split('\0') if len(v) > 0]
+            if "TCON" == frameId:
+                values = [decodeId3Genre(v) for v in values]
+            meta.frames.setdefault(frameId, []).extend(values)
+        else:
+            meta.frames.setdefault(frameId, [])
+    return pos
+
+def readId3Meta(fName: str, head: bytes = b''):
+    meta = Id3Meta()
+    with HeadFile(fName, head) as f:
+        # ID3v2 tag at the file beginning
+        head = f.read(10)
+        if len(head) == 10 and head[:3] == b'ID3' and 2 <= head[3] <= 4:
+            meta.version = head[3]
+            flags = head[5]
+            size = syncsafeInt(head[6:10])
+            meta.tagSize = 10 + size + (10 if flags & 0x10 else 0)
+            meta.audioOffset = meta.tagSize
+            data = f.read(size)
+            dataPos = 10
+            tagUnsync = (flags & 0x80) != 0
+            if tagUnsync and meta.version < 4:
+                data = data.replace(b'\xff\x00', b'\xff')
+            # Skip extended header
+            if flags & 0x40 and meta.version >= 3:
+                if 4 == meta.version:
+                    extLen = syncsafeInt(data[0:4])
+                else:
+                    extLen = 4 + int.from_bytes(data[0:4], 'big')
+                data = data[extLen:]
+                dataPos += extLen
+            framesEnd = parseId3Frames(meta, data, meta.version, tagUnsync and meta.version < 4, dataPos)
+            if data[framesEnd:].count(0) == len(data) - framesEnd:
+                meta.paddingSize = len(data) - framesEnd
+        # ID3v1 tag at the file end, used to complete missing ID3v2 frames
+        f.seek(0, os.SEEK_END)
+        if f.tell() >= meta.tagSize + 128:
+            f.seek(-128, os.SEEK_END)
+            tail = f.read(128)
+            if tail[:3] == b'TAG':
+                meta.hasV1 = True
+                v1 = {}
+                v1["TIT2"] = tail[3:33]
+                v1["TPE1"] = tail[33:63]
+                v1["TALB"] = tail[63:93]
+                v1["TDRC"] = tail[93:97]
+                if tail[125] == 0 and tail[126] != 0:
+                    v1["TRCK"] = str(tail[126]).encode()    # ID3v1.1 track number
+                for frameId, raw in v1.items():
+                    value = raw.split(b'\0')[0].decode('latin-1').strip()
+                    if len(value) > 0 and not frameId in meta.frames:
+                        meta.frames[frameId] = [value]
+                if tail[127] < len(ID3V1_GENRES) and not "TCON" in meta.frames:
+                    meta.frames["TCON"] = [ID3V1_GENRES[tail[127]]]
+        # APEv2 tag right before ID3v1 tag (or at the file end), items precede its 32-byte footer
+        apeEnd = f.seek(0, os.SEEK_END) - (128 if meta.hasV1 else 0)
+        if apeEnd >= meta.tagSize + 32:
+            f.seek(apeEnd - 32)
+            footer = f.read(32)
+            apeSize = int.from_bytes(footer[12:16], 'little')
+            if footer[:8] == b'APETAGEX' and 32 <= apeSize <= apeEnd - meta.tagSize:
+                f.seek(apeEnd - apeSize)
+                data = f.read(apeSize - 32)
+                pos = 0
+                for i in range(int.from_bytes(footer[16:20], 'little')):
+                    keyEnd = data.find(b'\0', pos+8)
+                    if keyEnd < 0:
+                        break
+                    valueLen = int.from_bytes(data[pos:pos+4], 'little')
+                    key = data[pos+8:keyEnd].decode('latin-1').upper()
+                    meta.apeItems[key] = data[keyEnd+1:keyEnd+1+valueLen].decode('utf-8', 'replace')
+                    pos = keyEnd + 1 + valueLen
+    return meta
+
+def buildId3Frame(frameId: str, body: bytes):
+    # ID3v2.4 frame with syncsafe size and no flags
+    size = len(body)
+    return frameId.encode('latin-1') + bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f]) + b'\0\0' + body
+
+def buildId3Picture(imgFormat: str, imgData: bytes):
+    # APIC frame body equivalent to 'mid3v2 -p ...', i.e. front cover with empty description
+    return b'\x00' + ("image/" + imgFormat).encode('latin-1') + b'\0' + b'\x03' + b'\0' + imgData
+
+def buildId3v1(title: str, artist: str, album: str, year: int, number: int, genre: str):
+    field = lambda s, n: s.encode('latin-1', 'replace')[:n].ljust(n, b'\0')
+    genreIdx = ID3V1_GENRES.index(genre) if genre in ID3V1_GENRES else 255
+    strYear = str(year) if 0 < year <= 9999 else ""
+    return b'TAG' + field(title, 30) + field(artist, 30) + field(album, 30) + field(strYear, 4) + b'\0'*28 \
+            + b'\0' + bytes([number if 0 < number < 256 else 0]) + bytes([genreIdx])
+
+def writeId3Tag(fName: str, meta: Id3Meta, frames, newV1: bytes = b''):
+    # Write complete ID3v2.4 tag made of 'frames' (frame ID, body) once. When it fits into the old tag (using its padding),
+    # the tag region is overwritten in place, otherwise the file is rewritten via temporary file with some fresh padding.
+    # The existing ID3v1 tag is replaced by 'newV1' if both are present.
+    data = b''.join(buildId3Frame(frameId, body) for frameId, body in frames)
+    inPlace = meta.tagSize >= 10 + len(data)
+    if inPlace:
+        padding = meta.tagSize - 10 - len(data)
+    else:
+        padding = 1024 + len(data) // 100
+    size = len(data) + padding
+    tag = b'ID3\x04\x00\x00' + bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f]) + data + b'\0' * padding
+    if inPlace:
+        with open(fName, 'r+b') as f:
+            f.write(tag)
+            if meta.hasV1 and len(newV1) == 128:
+                f.seek(-128, os.SEEK_END)
+                f.write(newV1)
+        return
+    with open(fName, 'rb') as src:
+        # Temporary file name is short, since audio file names may already come close to NAME_MAX
+        fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fName)), prefix=".audite-")
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                dst.write(tag)
+                src.seek(meta.audioOffset)
+                shutil.copyfileobj(src, dst, 1 << 20)
+                if meta.hasV1 and len(newV1) == 128:
+                    dst.seek(-128, os.SEEK_END)
+                    dst.write(newV1)
+                dst.flush()
+                os.fsync(dst.fileno())
+            shutil.copymode(fName, tmpPath)
+        except:
+            if os.path.isfile(tmpPath):
+                os.remove(tmpPath)
+            raise
+    os.replace(tmpPath, fName)
+
+class Mp4Meta:
+
+    def __init__(self):
+        self.tags = {}          # Item atom name (e.g. '\xa9nam') -> list of text values
+        self.trackNumber = 0
+        self.trackTotal = 0
+        self.pictures = []      # EmbeddedPicture objects from 'covr' item
+        self.hasMoov = False
+
+def iterMp4Atoms(f, start: int, end: int):
+    # Yield (type, data start, data end) for every atom within [start, end) using seeks only
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        head = f.read(8)
+        if len(head) < 8:
+            break
+        size = int.from_bytes(head[0:4], 'big')
+        atomType = head[4:8].decode('latin-1')
+        dataStart = pos + 8
+        if 1 == size:
+            size = int.from_bytes(f.read(8), 'big')
+            dataStart += 8
+        elif 0 == size:
+            size = end - pos    # Atom extends up to the end of its parent
+        if size < dataStart - pos:
+            break   # Damaged atom
+        yield atomType, dataStart, min(pos + size, end)
+        pos += size
+
+def findMp4Atom(f, start: int, end: int, atomType: str):
+    for aType, aStart, aEnd in iterMp4Atoms(f, start, end):
+        if aType == atomType:
+            return aStart, aEnd
+    return None
+
+def readMp4Meta(fName: str, head: bytes = b''):
+    meta = Mp4Meta()
+    with HeadFile(fName, head) as f:
+        f.seek(0, os.SEEK_END)
+        fileEnd = f.tell()
+        moov = findMp4Atom(f, 0, fileEnd, "moov")   # 'mdat' payload is skipped by seeking over it
+        if moov is None:
+            return meta
+        meta.hasMoov = True
+        udta = findMp4Atom(f, moov[0], moov[1], "udta")
+        if udta is None:
+            return meta
+        metaAtom = findMp4Atom(f, udta[0], udta[1], "meta")
+        if metaAtom is None:
+            return meta
+        ilst = findMp4Atom(f, metaAtom[0]+4, metaAtom[1], "ilst")   # 'meta' is a full box with 4 bytes of version/flags
+        if ilst is None:
+            return meta
+        for itemType, itemStart, itemEnd in iterMp4Atoms(f, ilst[0], ilst[1]):
+            for dataType, dataStart, dataEnd in iterMp4Atoms(f, itemStart, itemEnd):
+                if "data" != dataType or dataEnd - dataStart < 8:
+                    continue
+                f.seek(dataStart)
+                typeCode = int.from_bytes(f.read(4), 'big') & 0xffffff
+                payloadStart = dataStart + 8    # Skip type indicator and locale
+                payloadLen = dataEnd - payloadStart
+                if "covr" == itemType:
+                    pic = EmbeddedPicture()
+                    pic.picType = 3
+                    pic.dataOffset = payloadStart
+                    pic.dataLength = payloadLen
+                    f.seek(payloadStart)
+                    imgHead = f.read(min(payloadLen, 65536))
+                    pic.mime = {13: "image/jpeg", 14: "image/png", 27: "image/bmp"}.get(typeCode, "")
+                    pic.width, pic.height = imageDimensions(imgHead)
+                    meta.pictures.append(pic)
+                    continue
+                f.seek(payloadStart)
+                payload = f.read(min(payloadLen, 65536))
+                if itemType in ["trkn", "disk"]:
+                    if "trkn" == itemType and len(payload) >= 6:
+                        meta.trackNumber = int.from_bytes(payload[2:4], 'big')
+                        meta.trackTotal = int.from_bytes(payload[4:6], 'big')
+                        meta.tags.setdefault(itemType, []).append(f"{meta.trackNumber}/{meta.trackTotal}")
+                elif "gnre" == itemType and len(payload) >= 2:
+                    genreIdx = int.from_bytes(payload[0:2], 'big') - 1   # ID3v1 genre index plus one
+                    if 0 <= genreIdx < len(ID3V1_GENRES):
+                        meta.tags.setdefault(itemType, []).append(ID3V1_GENRES[genreIdx])
+                elif 1 == typeCode:
+                    meta.tags.setdefault(itemType, []).append(payload.decode('utf-8', 'replace'))
+        # Fall back to standard genre when free-form genre is absent
+        if not "\xa9gen" in meta.tags and "gnre" in meta.tags:
+            meta.tags["\xa9gen"] = meta.tags["gnre"]
+    return meta
+
+MP3_BITRATES = {1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320], \
+                2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]}  # kbps, layer III
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+class AudioProbe:
+
+    def __init__(self):
+        self.codec = ""         # 'flac', 'mp3', 'm4a' or empty when unrecognized
+        self.description = ""
+        self.sampleRate = 0
+        self.channels = 0
+        self.bitsPerSample = 0
+        self.bitrate = 0        # kbps, MP3 only
+        self.head = b''         # Leading bytes of the file, reused by metadata readers
+        self.dataOffset = 0     # Position of 'fLaC' marker or the first MP3 frame
+
+def parseMp3FrameHeader(data: bytes):
+    # Returns (MPEG version, sample rate, bitrate, channels, frame length) for a layer III frame header, None otherwise
+    if len(data) < 4 or data[0] != 0xff or (data[1] & 0xe0) != 0xe0:
+        return None
+    versionBits = (data[1] >> 3) & 0x03
+    layerBits = (data[1] >> 1) & 0x03
+    bitrateIdx = data[2] >> 4
+    rateIdx = (data[2] >> 2) & 0x03
+    if 1 == versionBits or 1 != layerBits or bitrateIdx in [0, 15] or 3 == rateIdx:
+        return None
+    version = {0: 25, 2: 2, 3: 1}[versionBits]
+    sampleRate = MP3_SAMPLE_RATES[version][rateIdx]
+    bitrate = MP3_BITRATES[1 if 1 == version else 2][bitrateIdx]
+    padding = (data[2] >> 1) & 0x01
+    channels = 1 if 3 == (data[3] >> 6) else 2
+    frameLen = (144 if 1 == version else 72) * bitrate * 1000 // sampleRate + padding
+    return version, sampleRate, bitrate, channels, frameLen
+
+def sniffAudioFile(fName: str):
+    probe = AudioProbe()
+    with open(fName, 'rb') as f:
+        probe.head = f.read(PROBE_HEAD_SIZE)
+    head = probe.head
+    # Skip ID3v2 tag if present (MP3 as well as occasionally tagged FLAC)
+    start = 0
+    if len(head) >= 10 and head[:3] == b'ID3':
+        start = 10 + syncsafeInt(head[6:10]) + (10 if head[5] & 0x10 else 0)
+    with HeadFile(fName, head) as f:
+        f.seek(start)
+        window = f.read(4096)
+        # FLAC stream
+        if window[:4] == b'fLaC' and len(window) >= 8+34:
+            probe.codec = "flac"
+            probe.dataOffset = start
+            bits = int.from_bytes(window[8+10:8+18], 'big')
+            probe.sampleRate = bits >> 44
+            probe.channels = ((bits >> 41) & 0x07) + 1
+            probe.bitsPerSample = ((bits >> 36) & 0x1f) + 1
+            probe.description = f"FLAC audio, {probe.bitsPerSample} bit, {probe.channels} channels, {probe.sampleRate} Hz"
+            return probe
+        # MP4 container with ALAC (or AAC) audio stream, checked before the frame scan since its payload may contain MPEG-like sync words
+        if head[4:8] == b'ftyp':
+            fileEnd = f.seek(0, os.SEEK_END)
+            atom = findMp4Atom(f, 0, fileEnd, "moov")
+            for path in ["trak", "mdia", "minf", "stbl", "stsd"]:
+                if atom is None:
+                    break
+                atom = findMp4Atom(f, atom[0], atom[1], path)
+            if atom != None:
+                f.seek(atom[0] + 8)     # Skip version/flags and entry count of 'stsd'
+                entry = f.read(72)
+                fourCC = entry[4:8].decode('latin-1')
+                if fourCC in ["alac", "mp4a"]:
+                    probe.codec = "m4a"
+                    probe.channels = int.from_bytes(entry[24:26], 'big')
+                    probe.bitsPerSample = int.from_bytes(entry[26:28], 'big')
+                    probe.sampleRate = int.from_bytes(entry[32:34], 'big')
+                    if "alac" == fourCC and entry[40:44] == b'alac' and len(entry) >= 72:
+                        # ALAC magic cookie holds exact parameters (sample entry cannot store rates above 65535 Hz)
+                        probe.bitsPerSample = entry[53]
+                        probe.channels = entry[57]
+                        probe.sampleRate = int.from_bytes(entry[68:72], 'big')
+                    probe.description = f"ISO Media, {'ALAC' if 'alac' == fourCC else 'AAC'}, {probe.channels} channels, {probe.sampleRate} Hz"
+                    return probe
+            probe.description = f"ISO Media, brand '{head[8:12].decode('latin-1')}'"
+            return probe
+        # MPEG layer III stream (fallback when no container magic matched), two consecutive frame headers are required unless the second one is out of window
+        pos = window.find(b'\xff')
+        while 0 <= pos < len(window) - 3:
+            frame = parseMp3FrameHeader(window[pos:pos+4])
+            if frame is None:
+                pos = window.find(b'\xff', pos+1)
+                continue
+            nextPos = pos + frame[4]
+            if nextPos + 4 <= len(window) and parseMp3FrameHeader(window[nextPos:nextPos+4]) is None:
+                pos = window.find(b'\xff', pos+1)
+                continue
+            probe.codec = "mp3"
+            probe.dataOffset = start + pos
+            version, probe.sampleRate, probe.bitrate, probe.channels, frameLen = frame
+            probe.bitsPerSample = 16
+            strVersion = "2.5" if 25 == version else str(version)
+            probe.description = f"MPEG ADTS, layer III, v{strVersion}, {probe.bitrate} kbps, {probe.sampleRate} Hz"
+            return probe
+    probe.description = f"unrecognized header {head[:16]}"
+    return probe
+
+def audioDuration(fName: str):
+    # Exact track length as (samples, sample rate) taken from headers only, None if it cannot be determined
+    probe = sniffAudioFile(fName)
+    if "flac" == probe.codec:
+        flacMeta = readFlacMeta(fName, probe.head)
+        if flacMeta != None and flacMeta.totalSamples > 0 and flacMeta.sampleRate > 0:
+            return flacMeta.totalSamples, flacMeta.sampleRate
+    elif "mp3" == probe.codec:
+        with HeadFile(fName, probe.head) as f:
+            f.seek(probe.dataOffset)
+            frame = f.read(256)
+            version, rate, bitrate, channels, frameLen = parseMp3FrameHeader(frame[:4])
+            frameSamples = 1152 if 1 == version else 576
+            # Xing/Info header follows side information of the first frame
+            xingPos = 4 + (32 if 1 == version else 17) if channels > 1 else 4 + (17 if 1 == version else 9)
+            if frame[xingPos:xingPos+4] in [b'Xing', b'Info']:
+                flags = int.from_bytes(frame[xingPos+4:xingPos+8], 'big')
+                if flags & 0x01:
+                    frames = int.from_bytes(frame[xingPos+8:xingPos+12], 'big')
+                    samples = frames * frameSamples
+                    # LAME tag stores encoder delay and padding (12 bits each) to be trimmed
+                    lamePos = xingPos + 8 + 4 * bin(flags & 0x0b).count("1") + (100 if flags & 0x04 else 0)
+                    if frame[lamePos:lamePos+4] == b'LAME':
+                        gapless = int.from_bytes(frame[lamePos+21:lamePos+24], 'big')
+                        samples -= (gapless >> 12) + (gapless & 0xfff)
+                    return max(samples, 0), rate
+            # VBRI header is always 32 bytes after the frame header
+            if frame[36:40] == b'VBRI':
+                return int.from_bytes(frame[50:54], 'big') * frameSamples, rate
+            # Constant bitrate estimate from the size of audio data
+            audioEnd = f.seek(0, os.SEEK_END)
+            id3Meta = readId3Meta(fName, probe.head)
+            if id3Meta.hasV1:
+                audioEnd -= 128
+            if bitrate > 0:
+                return (audioEnd - probe.dataOffset) * 8 * rate // (bitrate * 1000), rate
+    elif "m4a" == probe.codec:
+        # Media header of the (first) audio track holds duration in its own timescale
+        with HeadFile(fName, probe.head) as f:
+            atom = findMp4Atom(f, 0, f.seek(0, os.SEEK_END), "moov")
+            for path in ["trak", "mdia", "mdhd"]:
+                if atom is None:
+                    return None
+                atom = findMp4Atom(f, atom[0], atom[1], path)
+            if atom is None:
+                return None
+            f.seek(atom[0])
+            mdhd = f.read(32)
+            if 1 == mdhd[0]:
+                timescale, duration = int.from_bytes(mdhd[20:24], 'big'), int.from_bytes(mdhd[24:32], 'big')
+            else:
+                timescale, duration = int.from_bytes(mdhd[12:16], 'big'), int.from_bytes(mdhd[16:20], 'big')
+            if timescale > 0:
+                return duration, timescale
+    return None
+
+def probeTrackFile(fName: str):
+    # Sniff the codec and read the matching metadata, the result is cheap to pass between processes
+    if scanCache != None:
+        fileKey = knownIdentity(fName)
+        probed = scanCache.load("track", fileKey)
+        if probed != None:
+            return probed
+    probe = sniffAudioFile(fName)
+    meta = None
+    if "flac" == probe.codec:
+        meta = readFlacMeta(fName, probe.head)
+    elif "mp3" == probe.codec:
+        meta = readId3Meta(fName, probe.head)
+    elif "m4a" == probe.codec:
+        meta = readMp4Meta(fName, probe.head)
+    if meta != None and len(meta.pictures) > 0:
+        pic = meta.pictures[0]
+        pic.digest = digestFileRange(fName, pic.dataOffset, pic.dataLength)
+    probe.head = b''
+    if scanCache != None:
+        scanCache.store("track", fileKey, (probe, meta))
+    return probe, meta
+
+
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+# Persistent scan cache
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+SCAN_CACHE_VERSION = 4  # Bump whenever the cached classes change, old entries get dropped then
+
+def fileIdentity(fName: str):
+    st = os.stat(fName)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+class ScanCache:
+
+    def __init__(self, dbPath, rebuild = False):
+        # Define class fields
+        self.dbPath = ""
+        self.pid = 0
+        self.db = None
+        self.lock = threading.Lock()    # Tracks of an album are probed by several threads sharing the connection
+
+        # Setup cache database
+        self.dbPath = dbPath
+        os.makedirs(os.path.dirname(self.dbPath), exist_ok=True)
+        db = self.connect()
+        if rebuild or db.execute("PRAGMA user_version").fetchone()[0] != SCAN_CACHE_VERSION:
+            db.execute("DELETE FROM files")
+            db.execute("DELETE FROM albums")
+            db.execute(f"PRAGMA user_version = {SCAN_CACHE_VERSION}")
+            db.commit()
+
+    def connect(self):
+        # SQLite connections must not cross fork(), so every worker process opens its own one
+        if self.pid != os.getpid():
+            self.db = sqlite3.connect(self.dbPath, timeout=60, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS files (kind TEXT, dev INTEGER, ino INTEGER, size INTEGER, mtime INTEGER, data BLOB, PRIMARY KEY (kind, dev, ino))")
+            self.db.execute("CREATE TABLE IF NOT EXISTS albums (path TEXT PRIMARY KEY, fingerprint TEXT, title TEXT)")
+            self.pid = os.getpid()
+        return self.db
+
+    def load(self, kind: str, fileKey):
+        # Entry is valid only if both size and modification time are the same
+        try:
+            with self.lock:
+                row = self.connect().execute("SELECT size, mtime, data FROM files WHERE kind=? AND dev=? AND ino=?", (kind, fileKey[0], fileKey[1])).fetchone()
+            if row is None or (row[0], row[1]) != (fileKey[2], fileKey[3]):
+                return None
+            return pickle.loads(row[2])
+        except Exception:
+            return None
+
+    def store(self, kind: str, fileKey, value):
+        try:
+            with self.lock:
+                db = self.connect()
+                db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", (kind,) + tuple(fileKey) + (pickle.dumps(value),))
+                db.commit()
+        except sqlite3.Error:
+            pass    # Cache is an optimisation only
+
+    def loadAlbum(self, albumPath: str, fingerprint: str):
+        # Returns the title of an album found OK last time, if it hasn't been changed since then
+        try:
+            row = self.connect().execute("SELECT fingerprint, title FROM albums WHERE path=?", (albumPath,)).fetchone()
+            if row is None or row[0] != fingerprint:
+                return None
+            return row[1]
+        except sqlite3.Error:
+            return None
+
+    def storeAlbum(self, albumPath: str, fingerprint: str, title: str):
+        try:
+            db = self.connect()
+            if fingerprint is None:
+                db.execute("DELETE FROM albums WHERE path=?", (albumPath,))
+            else:
+                db.execute("INSERT OR REPLACE INTO albums VALUES (?, ?, ?)", (albumPath, fingerprint, title))
+            db.commit()
+        except sqlite3.Error:
+            pass
+
+def albumFingerprint(dName: str):
+    # Album directory mtime plus name, size and mtime of every entry (subdirectory mtimes included),
+    # salted with the settings which affect the verdict
+    digest = hashlib.sha1(repr((baseDir, noCaps, allowComposer, skipReplayGain, minTracks, bandName, composerName, albumYear, albumGenre)).encode())
+    digest.update(f"{os.stat(dName).st_mtime_ns}\n".encode())
+    listing = listDir(dName)
+    for name in listing.names:
+        size, mtime = listing.stats[name]
+        digest.update(f"{name}\0{size}\0{mtime}\n".encode())
+    return digest.hexdigest()
+
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+# Loudness analysis (ReplayGain)
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+RG_REFERENCE_LUFS = -18.0       # ReplayGain 2.0 target, also written as reference loudness to tell it from ReplayGain 1.0
+RG_CHUNK_FRAMES = 1 << 18       # PCM frames decoded and filtered at once
+
+@functools.lru_cache(maxsize=None)
+def kWeightingResponse(sampleRate: int):
+    # Impulse response of ITU-R BS.1770 K-weighting (high shelf followed by high pass) for any sample rate,
+    # 0.5 s long, which is far beyond the point where it decays below float precision
+    K = math.tan(math.pi * 1681.974450955533 / sampleRate)
+    Q = 0.7071752369554196
+    Vh = math.pow(10.0, 3.999843853973347 / 20.0)
+    Vb = math.pow(Vh, 0.4996667741545416)
+    a0 = 1.0 + K/Q + K*K
+    shelf = ([(Vh + Vb*K/Q + K*K) / a0, 2.0*(K*K - Vh) / a0, (Vh - Vb*K/Q + K*K) / a0], [2.0*(K*K - 1.0) / a0, (1.0 - K/Q + K*K) / a0])
+    K = math.tan(math.pi * 38.13547087602444 / sampleRate)
+    Q = 0.5003270373238773
+    a0 = 1.0 + K/Q + K*K
+    highPass = ([1.0, -2.0, 1.0], [2.0*(K*K - 1.0) / a0, (1.0 - K/Q + K*K) / a0])
+    response = [1.0] + [0.0] * (sampleRate//2 - 1)
+    for b, a in [shelf, highPass]:
+        x1 = x2 = y1 = y2 = 0.0
+        for n, x0 in enumerate(response):
+            y0 = b[0]*x0 + b[1]*x1 + b[2]*x2 - a[0]*y1 - a[1]*y2
+            x2, x1, y2, y1 = x1, x0, y1, y0
+            response[n] = y0
+    return np.array(response)
+
+def analyseLoudness(fName: str):
+    # Decode the track into float PCM with 'ffmpeg', return powers of its 400 ms gating blocks (75% overlap) and sample peak
+    probe = sniffAudioFile(fName)
+    rate, channels = probe.sampleRate, probe.channels
+    if rate <= 0 or channels <= 0:
+        return None
+    pipe = proc.Popen(["ffmpeg", "-hide_banner", "-v", "error", "-i", fName, "-map", "0:a:0", "-ac", str(channels), "-ar", str(rate), \
+                       "-f", "f32le", "-acodec", "pcm_f32le", "-"], stdout=proc.PIPE, stderr=proc.DEVNULL)
+    response = kWeightingResponse(rate)
+    spectra = {}
+    weights = np.ones(channels)
+    if 6 == channels:
+        weights[3:6] = [0.0, 1.41, 1.41]   # 5.1: LFE is ignored, surround channels are emphasized
+    hop = rate // 10
+    tail = np.zeros((len(response)-1, channels))
+    pending = np.zeros(0)
+    steps = []
+    peak = 0.0
+    frameBytes = 4 * channels
+    while True:
+        raw = pipe.stdout.read(RG_CHUNK_FRAMES * frameBytes)
+        if len(raw) < frameBytes:
+            break
+        x = np.frombuffer(raw, dtype='<f4', count=len(raw)//4 - (len(raw)//4) % channels).reshape(-1, channels).astype(np.float64)
+        peak = max(peak, float(np.abs(x).max()))
+        # Overlap-add FFT convolution with K-weighting response
+        n = len(x)
+        size = 1 << (n + len(response) - 2).bit_length()
+        if not size in spectra:
+            spectra[size] = np.fft.rfft(response, size)[:, None]
+        y = np.fft.irfft(np.fft.rfft(x, size, axis=0) * spectra[size], size, axis=0)[:n + len(response) - 1]
+        y[:len(tail)] += tail
+        tail = y[n:]
+        # Weighted mean square power summed over 100 ms steps
+        power = np.concatenate((pending, (y[:n]**2) @ weights))
+        full = len(power) - len(power) % hop
+        steps.append(power[:full].reshape(-1, hop).sum(axis=1))
+        pending = power[full:]
+    pipe.stdout.close()
+    if pipe.wait() != 0:
+        return None
+    steps = np.concatenate(steps) if len(steps) > 0 else np.zeros(0)
+    if len(steps) < 4:
+        return np.zeros(0), peak
+    blocks = (steps[:-3] + steps[1:-2] + steps[2:-1] + steps[3:]) / (4*hop)
+    return blocks, peak
+
+def replayGainOf(blocks):
+    # Integrated loudness with absolute (-70 LUFS) and relative (-10 LU) gating, turned into gain towards the reference
+    blocks = blocks[blocks > math.pow(10.0, (-70.0 + 0.691) / 10.0)]
+    if 0 == len(blocks):
+        return 0.0  # Digital silence
+    blocks = blocks[blocks > 0.1 * np.mean(blocks)]
+    return RG_REFERENCE_LUFS - (-0.691 + 10.0 * math.log10(np.mean(blocks)))
+
+def measureReplayGain(fNames):
+    # Measure all the tracks of an album concurrently, return REPLAYGAIN_* tags (name, value) for each of them
+    # (empty list if the track could not be measured) and error report, empty if everything went fine
+    if workerPool != None:
+        results = workerPool.map(analyseLoudness, fNames)
+    else:
+        # Decoding happens in 'ffmpeg' processes and NumPy releases GIL, so threads are enough inside pool workers
+        with concurrent.futures.ThreadPoolExecutor(max(1, (os.cpu_count() or 1) // numJobs)) as executor:
+            results = list(executor.map(analyseLoudness, fNames))
+    report = ""
+    for fName, result in zip(fNames, results):
+        if result is None:
+            report += f"\nERROR when measuring loudness of '{fName}'"
+    measured = [result for result in results if result != None]
+    if 0 == len(measured):
+        return [[] for fName in fNames], report
+    albumGain = replayGainOf(np.concatenate([blocks for blocks, peak in measured]))
+    albumPeak = max(peak for blocks, peak in measured)
+    rgTags = []
+    for result in results:
+        if result is None:
+            rgTags.append([])
+        else:
+            blocks, peak = result
+            rgTags.append([("REPLAYGAIN_REFERENCE_LOUDNESS", f"{RG_REFERENCE_LUFS:.2f} LUFS"), ("REPLAYGAIN_TRACK_GAIN", f"{replayGainOf(blocks):+.2f} dB"), ("REPLAYGAIN_TRACK_PEAK", f"{peak:.8f}"), \
+                           ("REPLAYGAIN_ALBUM_GAIN", f"{albumGain:+.2f} dB"), ("REPLAYGAIN_ALBUM_PEAK", f"{albumPeak:.8f}")])
+    return rgTags, report
+
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 # Classes
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
@@ -348,28 +1847,45 @@ class CoverImage:
         self.strStatus = ""
         self.needsRename = True
         self.needsResize = True
+        #
+        self.flacPicture = b''  # Prepared FLAC PICTURE block payload, shared by all tracks of the album
+        self.id3Picture = b''   # Prepared ID3 APIC frame body, shared by all tracks of the album
+        self.digest = b''       # Digest of image file, computed once on the first comparison
 
         # Setup cover image
         self.albumPath = parentDir
         self.imageFile = fileName
         self.fullPath = os.path.join(parentDir, fileName)
-        assert os.path.isfile(self.fullPath)
+        assert isKnownFile(self.fullPath)
 
         # Analyze image file
         dotPos = fileName.rindex('.')
         self.ext = fileName[dotPos+1:]
         self.name = fileName[:dotPos]
-        imgProps = os.popen(f'identify -format "%w %h %Q %b" -precision 16 "{self.fullPath}"').read().split(" ")
-        imgProps[3] = imgProps[3][:-1]
-        assert(len(imgProps) == 4)
-        assert(imgProps[0].isnumeric())
-        assert(imgProps[1].isnumeric())
-        assert(imgProps[2].isnumeric())
-        assert(imgProps[3].isnumeric())
-        self.width = int(imgProps[0])
-        self.height = int(imgProps[1])
-        self.quality = int(imgProps[2])
-        self.fileSize = int(imgProps[3])
+        fileKey = knownIdentity(self.fullPath)
+        self.fileSize = fileKey[2]
+        cached = None
+        if scanCache != None:
+            cached = scanCache.load("image", fileKey)
+        if cached != None:
+            self.width, self.height, self.quality = cached
+        else:
+            with open(self.fullPath, 'rb') as f:
+                imgFormat, self.width, self.height, self.quality = probeImage(f)
+            if "jpeg" != imgFormat and self.width > 0 and self.height > 0:
+                self.quality = 100  # Lossless (or unknown lossy) formats are always reencoded into JPEG
+            if self.width == 0 or self.height == 0:
+                # Fall back to ImageMagick for unusual image headers
+                imgProps = os.popen(f'magick identify -format "%w %h %Q" "{self.fullPath}[0]"').read().split(" ")
+                assert(len(imgProps) == 3)
+                assert(imgProps[0].isnumeric())
+                assert(imgProps[1].isnumeric())
+                assert(imgProps[2].isnumeric())
+                self.width = int(imgProps[0])
+                self.height = int(imgProps[1])
+                self.quality = int(imgProps[2])
+            if scanCache != None:
+                scanCache.store("image", fileKey, (self.width, self.height, self.quality))
         if self.quality == 0:
             self.quality = 80
         self.suitability = asymCrit(self.width, 1000) + asymCrit(self.height, 1000) + nameCrit(self.name) + asymCrit(self.quality, 80)
@@ -394,6 +1910,17 @@ class CoverImage:
     def __gt__(self, other):
         return self.suitability > other.suitability
 
+    def isEmbeddedIn(self, fName: str, pic: EmbeddedPicture):
+        # Compare picture embedded into audio file 'fName' with this image byte-wise (length first, then digest),
+        # renaming keeps image bytes as they are, so only resizing makes any embedded copy outdated
+        if self.needsResize or pic.dataLength != self.fileSize:
+            return False
+        if 0 == len(self.digest):
+            self.digest = digestFileRange(self.fullPath, 0, self.fileSize)
+        if 0 == len(pic.digest):
+            pic.digest = digestFileRange(fName, pic.dataOffset, pic.dataLength)
+        return len(pic.digest) > 0 and pic.digest == self.digest
+
     def coerce(self):
         print(f"\t* Coercing cover image '{self.imageFile}':", end=" ")
         if self.isOk():
@@ -427,9 +1954,20 @@ class CoverImage:
         # Picture is coerced
         print("DONE")
 
+    def preparePictures(self):
+        # Read and parse the final cover once, then build the embedded picture payloads for all tracks
+        if not self.isOk() or len(self.flacPicture) > 0:
+            return
+        with open(self.fullPath, 'rb') as f:
+            imgFormat, width, height, quality = probeImage(f)
+            f.seek(0)
+            imgData = f.read()
+        self.flacPicture = buildFlacPicture(imgFormat, width, height, imgData)
+        self.id3Picture = buildId3Picture(imgFormat, imgData)
+
 class Track:
 
-    def __init__(self, album, fileName, checkNum):
+    def __init__(self, album, fileName, checkNum, probed = None):
         # Define class fields
         self.albumPath = ""
         self.audioFile = ""
@@ -456,11 +1994,13 @@ class Track:
         #
         self.strStatus = ""
         self.strMetaStatus = ""
+        self.checkNum = 0
         self.misnumbered = False
         self.needsReencode = False
         self.needsRename = False
         self.needsRemark = False
         self.needsReplayGain = False
+        self.rgTags = []    # REPLAYGAIN_* tags (name, value) measured in-process, written along with FLAC metadata
         #
         self.renewPicture = False
         self.deleteApplication = False
@@ -472,7 +2012,8 @@ class Track:
         self.albumPath = self.album.fullPath
         self.audioFile = fileName
         self.fullPath = os.path.join(self.albumPath, fileName)
-        assert os.path.isfile(self.fullPath)
+        self.checkNum = checkNum
+        assert isKnownFile(self.fullPath)
 
         # Analyze audio file name
         dotPos = fileName.rindex('.')
@@ -498,25 +2039,28 @@ class Track:
                 self.name = numAndTitle
 
         # Analyze audio file contents and extract metadata from it
-        stats = os.popen(f'file "{self.fullPath}"').read()
-        if stats.find("FLAC") >= 0:
+        if probed is None:
+            probed = probeTrackFile(self.fullPath)
+        probe, meta = probed
+        if "flac" == probe.codec:
             self.codec = "flac"
+            # Read all FLAC metadata blocks at once
+            flacMeta = meta
+            if flacMeta is None:
+                flacMeta = FlacMeta()   # Proceed with empty metadata, the file will be reencoded
+                self.strMetaStatus += "\n\t\t+ damaged FLAC metadata blocks"
+            tags = flacMeta.tags
             # FLAC audio length (in samples)
-            strSamples = os.popen(f'metaflac --show-total-samples "{self.fullPath}"').read()
-            if strSamples[0] == '0':
+            if 0 == flacMeta.totalSamples:
                 self.needsReencode = True
                 self.strMetaStatus += "\n\t\t+ missing audio length, reencoding required"
-            strTags = os.popen(f'metaflac --show-all-tags "{self.fullPath}"').read()
-            strTagsUpper = strTags.upper()
             # Parasitic tags
-            pos = strTagsUpper.find("LOG=")
-            if pos >= 0:
+            if "LOG" in tags:
                 self.needsRemark = True
             # FLAC track number
-            pos = strTags.find("TRACKNUMBER=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+12)
-                strNumber = strTags[pos+12:end].strip()
+            vals = tags.get("TRACKNUMBER", [])
+            if len(vals) > 0:
+                strNumber = vals[0].strip()
                 if strNumber.isnumeric():
                     self.metaNumber = int(strNumber)
                     if len(strNumber) != len(str(self.album.trackTotal)):
@@ -525,17 +2069,16 @@ class Track:
                 else:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ invalid TRACKNUMBER tag '"+strNumber+"'"
-                if strTagsUpper.count("TRACKNUMBER=") > 1:
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate TRACKNUMBER tag"
             else:
                 self.needsRemark = True
                 self.strMetaStatus += "\n\t\t+ missing TRACKNUMBER tag"
             # FLAC track total
-            pos = strTags.find("TRACKTOTAL=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+11)
-                strTrackTot = strTags[pos+11:end].strip()
+            vals = tags.get("TRACKTOTAL", [])
+            if len(vals) > 0:
+                strTrackTot = vals[0].strip()
                 if strTrackTot.isnumeric():
                     self.metaTrackTotal = int(strTrackTot)
                 else:
@@ -545,7 +2088,7 @@ class Track:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ TRACKTOTAL tag '{strTrackTot}' differs from CUE tag, priority for '{self.album.trackTotal}'"
                     self.metaTrackTotal = self.album.trackTotal
-                if strTagsUpper.count("TRACKTOTAL=") > 1:
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate TRACKTOTAL tag"
             else:
@@ -553,27 +2096,25 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing TRACKTOTAL tag, suggested '{self.album.trackTotal}'"
                 self.metaTrackTotal = self.album.trackTotal
             # FLAC title
-            pos = strTags.find("TITLE=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+6)
-                self.metaTitle = strTags[pos+6:end].strip()
-                if strTagsUpper.count("TITLE=") > 1:
+            vals = tags.get("TITLE", [])
+            if len(vals) > 0:
+                self.metaTitle = vals[0].strip()
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate TITLE tag"
             else:
                 self.needsRemark = True
                 self.strMetaStatus += "\n\t\t+ missing TITLE tag"
             # FLAC artist
-            pos = strTags.find("ARTIST=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+7)
-                self.metaArtist = strTags[pos+7:end].strip()
+            vals = tags.get("ARTIST", [])
+            if len(vals) > 0:
+                self.metaArtist = vals[0].strip()
                 if ensureStringSafety(self.metaArtist) != ensureStringSafety(self.album.artist) and len(self.album.artist) > 0:
                     if self.album.artist.lower() != "various artists":
                         self.needsRemark = True
                         self.strMetaStatus += f"\n\t\t+ ARTIST tag '{self.metaArtist}' differs from album's artist, priority for '{self.album.artist}'"
                         self.metaArtist = self.album.artist
-                if strTagsUpper.count("ARTIST=") > 1:
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate ARTIST tag"
             else:
@@ -582,15 +2123,14 @@ class Track:
                 self.metaArtist = self.album.artist
             # FLAC composer
             if allowComposer:
-                pos = strTags.find("COMPOSER=")
-                if pos >= 0:
-                    end = strTags.index('\n',pos+9)
-                    self.metaComposer = strTags[pos+9:end].strip()
+                vals = tags.get("COMPOSER", [])
+                if len(vals) > 0:
+                    self.metaComposer = vals[0].strip()
                     if ensureStringSafety(self.metaComposer) != ensureStringSafety(self.album.composer) and len(self.album.composer) > 0:
                         self.needsRemark = True
                         self.strMetaStatus += f"\n\t\t+ COMPOSER tag '{self.metaComposer}' differs from album's composer, priority for '{self.album.composer}'"
                         self.metaComposer = self.album.composer
-                    if strTagsUpper.count("COMPOSER=") > 1:
+                    if len(vals) > 1:
                         self.needsRemark = True
                         self.strMetaStatus += "\n\t\t+ duplicate COMPOSER tag"
                 elif len(self.album.composer) > 0:
@@ -598,15 +2138,14 @@ class Track:
                     self.strMetaStatus += f"\n\t\t+ missing COMPOSER tag, suggested '{self.album.composer}'"
                     self.metaComposer = self.album.composer
             # FLAC album
-            pos = strTags.find("ALBUM=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+6)
-                self.metaAlbum = strTags[pos+6:end].strip()
+            vals = tags.get("ALBUM", [])
+            if len(vals) > 0:
+                self.metaAlbum = vals[0].strip()
                 if ensureStringSafety(self.metaAlbum) != ensureStringSafety(self.album.title) and len(self.album.title) > 0:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ ALBUM '{self.metaAlbum}' differs from album's title, priority for '{self.album.title}'"
                     self.metaAlbum = self.album.title
-                if strTagsUpper.count("ALBUM=") > 1:
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate ALBUM tag"
             else:
@@ -614,10 +2153,9 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing ALBUM tag, suggested '{self.album.title}'"
                 self.metaAlbum = self.album.title
             # FLAC date
-            pos = strTags.find("DATE=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                strDate = strTags[pos+5:end].strip()
+            vals = tags.get("DATE", [])
+            if len(vals) > 0:
+                strDate = vals[0].strip()
                 if strDate.isnumeric():
                     self.metaDate = int(strDate)
                     if self.metaDate != self.album.year and 0 < self.album.year <= NOW_YEAR:
@@ -628,7 +2166,7 @@ class Track:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ invalid DATE tag '{strDate}', suggested '{self.album.year:04d}'"
                     self.metaDate = self.album.year
-                if strTagsUpper.count("DATE=") > 1:
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate DATE tag"
             elif 0 < self.album.year <= NOW_YEAR:
@@ -636,15 +2174,14 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing DATE tag, suggested '{self.album.year:04d}'"
                 self.metaDate = self.album.year
             # FLAC genre
-            pos = strTags.find("GENRE=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+6)
-                self.metaGenre = strTags[pos+6:end].strip()
+            vals = tags.get("GENRE", [])
+            if len(vals) > 0:
+                self.metaGenre = vals[0].strip()
                 if self.metaGenre != self.album.genre and len(self.album.genre) > 0:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ GENRE tag '{self.metaGenre}' differs from CUE tag, priority for '{self.album.genre}'"
                     self.metaGenre = self.album.genre
-                if strTagsUpper.count("GENRE=") > 1:
+                if len(vals) > 1:
                     self.needsRemark = True
                     self.strMetaStatus += "\n\t\t+ duplicate GENRE tag"
             elif len(self.album.genre) > 0:
@@ -652,55 +2189,43 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing GENRE tag, suggested '{self.album.genre}'"
                 self.metaGenre = self.album.genre
             # FLAC cover image
-            strPic = os.popen(f'metaflac --list --block-type=PICTURE "{self.fullPath}" | head -n 9').read()
-            if len(strPic) < 10:
+            if 0 == len(flacMeta.pictures):
                 self.needsRemark = True
                 self.renewPicture = True
                 self.strMetaStatus += "\n\t\t+ missing PICTURE block"
             elif album.cover != None:
-                if strPic.find("Cover") < 0 or strPic.find(f"width: {album.cover.bestWH}") < 0 or strPic.find(f"height: {album.cover.bestWH}") < 0 \
-                        or strPic.find("image/jpeg") < 0:
+                pic = flacMeta.pictures[0]
+                if pic.picType != 3 or pic.mime != "image/jpeg" or not album.cover.isEmbeddedIn(self.fullPath, pic):
                     self.needsRemark = True
                     self.renewPicture = True
                     self.strMetaStatus += "\n\t\t+ imperfect PICTURE block"
             # FLAC replay gain
             if not skipReplayGain:
-                pos = strTags.find("REPLAYGAIN_REFERENCE_LOUDNESS")
-                self.needsReplayGain |= (0 > pos)
-                pos = strTags.find("REPLAYGAIN_TRACK_GAIN")
-                self.needsReplayGain |= (0 > pos)
-                pos = strTags.find("REPLAYGAIN_TRACK_PEAK")
-                self.needsReplayGain |= (0 > pos)
-                pos = strTags.find("REPLAYGAIN_ALBUM_GAIN")
-                self.needsReplayGain |= (0 > pos)
-                pos = strTags.find("REPLAYGAIN_ALBUM_PEAK")
-                self.needsReplayGain |= (0 > pos)
+                for rgTag in ["REPLAYGAIN_REFERENCE_LOUDNESS", "REPLAYGAIN_TRACK_GAIN", "REPLAYGAIN_TRACK_PEAK", "REPLAYGAIN_ALBUM_GAIN", "REPLAYGAIN_ALBUM_PEAK"]:
+                    self.needsReplayGain |= not rgTag in tags
                 if self.needsReplayGain:
                     self.strMetaStatus += "\n\t\t+ missing FLAC replay gain information"
             # excessive FLAC blocks
-            strBlock = os.popen(f'metaflac --list --block-type=SEEKTABLE "{self.fullPath}" | head -n 2').read()
-            if len(strBlock) > 2:
+            if flacMeta.countBlocks(FLAC_SEEKTABLE) > 0:
                 self.needsRemark = True
                 self.deleteSeektable = True
                 self.strMetaStatus += "\n\t\t+ worthless SEEKTABLE block will be removed"
-            strBlock = os.popen(f'metaflac --list --block-type=APPLICATION "{self.fullPath}" | head -n 2').read()
-            if len(strBlock) > 2:
+            if flacMeta.countBlocks(FLAC_APPLICATION) > 0:
                 self.needsRemark = True
                 self.deleteApplication = True
                 self.strMetaStatus += "\n\t\t+ worthless APPLICATION block(s) will be removed"
-            strBlock = os.popen(f'metaflac --list --block-type=PADDING "{self.fullPath}" | head -n 2').read()
-            if len(strBlock) > 2:
+            if flacMeta.countBlocks(FLAC_PADDING) > 0:
                 self.needsRemark = True
                 self.deletePadding = True
                 self.strMetaStatus += "\n\t\t+ worthless PADDING block(s) will be removed"
-        elif stats.find("MPEG ADTS, layer III") >= 0:
+        elif "mp3" == probe.codec:
             self.codec = "mp3"
-            strTags = os.popen(f'mid3v2 -l "{self.fullPath}"').read()
+            id3Meta = meta
+            frames = id3Meta.frames
             # MP3 track number/track total
-            pos = strTags.find("TRCK=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                strTrck = strTags[pos+5:end].strip()
+            vals = frames.get("TRCK", [])
+            if len(vals) > 0:
+                strTrck = vals[0].strip()
                 pos = strTrck.find("/")
                 if pos > 0:
                     strNumber = strTrck[:pos].strip()
@@ -739,18 +2264,16 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing TRCK (track number/track total) tag, suggested track total '{self.album.trackTotal}'"
                 self.metaTrackTotal = self.album.trackTotal
             # MP3 title
-            pos = strTags.find("TIT2=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaTitle = strTags[pos+5:end].strip()
+            vals = frames.get("TIT2", [])
+            if len(vals) > 0:
+                self.metaTitle = vals[0].strip()
             else:
                 self.needsRemark = True
                 self.strMetaStatus += "\n\t\t+ missing TIT2 (title) tag"
             # MP3 artist
-            pos = strTags.find("TPE1=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaArtist = strTags[pos+5:end].strip()
+            vals = frames.get("TPE1", [])
+            if len(vals) > 0:
+                self.metaArtist = vals[0].strip()
                 if ensureStringSafety(self.metaArtist) != ensureStringSafety(self.album.artist) and len(self.album.artist) > 0:
                     if self.album.artist.lower() != "various artists":
                         self.needsRemark = True
@@ -762,10 +2285,9 @@ class Track:
                 self.metaArtist = self.album.artist
             # MP3 composer
             if allowComposer:
-                pos = strTags.find("TCOM=")
-                if pos >= 0:
-                    end = strTags.index('\n',pos+5)
-                    self.metaComposer = strTags[pos+5:end].strip()
+                vals = frames.get("TCOM", [])
+                if len(vals) > 0:
+                    self.metaComposer = vals[0].strip()
                     if ensureStringSafety(self.metaComposer) != ensureStringSafety(self.album.composer) and len(self.album.composer) > 0:
                         self.needsRemark = True
                         self.strMetaStatus += f"\n\t\t+ TCOM (composer) tag '{self.metaComposer}' differs from album's composer, priority for '{self.album.composer}'"
@@ -775,10 +2297,9 @@ class Track:
                     self.strMetaStatus += f"\n\t\t+ missing TCOM (composer) tag, suggested '{self.album.composer}'"
                     self.metaComposer = self.album.composer
             # MP3 album
-            pos = strTags.find("TALB=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaAlbum = strTags[pos+5:end].strip()
+            vals = frames.get("TALB", [])
+            if len(vals) > 0:
+                self.metaAlbum = vals[0].strip()
                 if ensureStringSafety(self.metaAlbum) != ensureStringSafety(self.album.title) and len(self.album.title) > 0:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ TALB (album) tag '{self.metaAlbum}' differs from album's title, priority for '{self.album.title}'"
@@ -788,10 +2309,9 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing TALB (album) tag, suggested '{album.title}'"
                 self.metaAlbum = self.album.title
             # MP3 date
-            pos = strTags.find("TDRC=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                strDate = strTags[pos+5:end].strip()
+            vals = frames.get("TDRC", [])
+            if len(vals) > 0:
+                strDate = vals[0].strip()
                 if strDate.isnumeric():
                     self.metaDate = int(strDate)
                     if self.metaDate != self.album.year and 0 < self.album.year <= NOW_YEAR:
@@ -807,10 +2327,9 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing TDRC (year) tag, suggested '{self.album.year:04d}'"
                 self.metaDate = self.album.year
             # MP3 genre
-            pos = strTags.find("TCON=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaGenre = strTags[pos+5:end].strip()
+            vals = frames.get("TCON", [])
+            if len(vals) > 0:
+                self.metaGenre = vals[0].strip()
                 if self.metaGenre != self.album.genre and len(self.album.genre) > 0:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ TCON (genre) tag '{self.metaGenre}' differs from CUE tag, priority for '{self.album.genre}'"
@@ -820,18 +2339,10 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing TCON (genre) tag, suggested '{self.album.genre}'"
                 self.metaGenre = self.album.genre
             # MP3 cover image
-            pos = strTags.find("APIC=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                picToks = strTags[pos+5:end].strip().split(' ')
-                tok = ""
-                for i in range(len(picToks)-1, -1, -1):
-                    tok = picToks[i]
-                    if tok.isnumeric():
-                        break
-                picFileSize = int(tok)
+            if len(id3Meta.pictures) > 0:
+                pic = id3Meta.pictures[0]
                 if self.album.cover != None:
-                    if not self.album.cover.isOk() or picFileSize != self.album.cover.fileSize:
+                    if pic.mime != "image/jpeg" or not self.album.cover.isEmbeddedIn(self.fullPath, pic):
                         self.needsRemark = True
                         self.renewPicture = True
                         self.strMetaStatus += "\n\t\t+ imperfect APIC (cover image) block"
@@ -839,51 +2350,43 @@ class Track:
                 self.needsRemark = True
                 self.renewPicture = album.cover != None
                 self.strMetaStatus += "\n\t\t+ missing APIC (cover image)"
-            # MP3 always needs replay gain check by default
+            # MP3 replay gain: either ReplayGain TXXX frames or 'mp3gain' state within APEv2 tag
             if not skipReplayGain:
-                self.needsReplayGain = True
-                self.strMetaStatus += "\n\t\t+ MP3 replay gain will be verified anyway"
-        elif stats.find("ALAC") >= 0:
+                apeItems = id3Meta.apeItems
+                hasId3Gain = "TXXX:REPLAYGAIN_TRACK_GAIN" in frames
+                hasApeGain = "MP3GAIN_UNDO" in apeItems or "REPLAYGAIN_TRACK_GAIN" in apeItems
+                if not (hasId3Gain or hasApeGain):
+                    self.needsReplayGain = True
+                    self.strMetaStatus += "\n\t\t+ missing MP3 replay gain information"
+        elif "m4a" == probe.codec:
             self.codec = "m4a"
             # Deal with yet inacceptable ALAC
             self.strMetaStatus += "\n\t\t+ ALAC file format (.m4a) is not accepted yet, will be reencoded into FLAC (.flac)"
             #
-            strTags = os.popen(f'mutagen-inspect "{self.fullPath}"').read()
+            mp4Meta = meta
+            tags = mp4Meta.tags
             # MP4 track number/track total
-            pos = strTags.find("trkn=(")
-            if pos >= 0:
-                end = strTags.index(')',pos+6)
-                strTrck = strTags[pos+6:end].strip()
-                pos = strTrck.find(",")
-                if pos > 0:
-                    strNumber = strTrck[:pos].strip()
-                    if strNumber.isnumeric():
-                        self.metaNumber = int(strNumber)
-                        if len(strNumber) != len(str(self.album.trackTotal)):
-                            self.needsRemark = True
-                            self.strMetaStatus += f"\n\t\t+ imperfect ©TRKN number tag format, suggested '{self.album.tNumFmt}'"
-                    else:
-                        self.needsRemark = True
-                        self.strMetaStatus += "\n\t\t+ invalid ©TRKN number tag '"+strNumber+"'"
-                    strTotal = strTrck[pos+1:].strip()
-                    if strTotal.isnumeric():
-                        self.metaTrackTotal = int(strTotal)
-                    else:
+            if "trkn" in tags:
+                strNumber = str(mp4Meta.trackNumber)
+                strTotal = str(mp4Meta.trackTotal)
+                if mp4Meta.trackNumber > 0:
+                    self.metaNumber = mp4Meta.trackNumber
+                    if len(strNumber) != len(str(self.album.trackTotal)):
                         self.needsRemark = True
-                        self.strMetaStatus += "\n\t\t+ invalid ©TRKN total tag '"+strTotal+"'"
+                        self.strMetaStatus += f"\n\t\t+ imperfect ©TRKN number tag format, suggested '{self.album.tNumFmt}'"
+                else:
+                    self.needsRemark = True
+                    self.strMetaStatus += "\n\t\t+ invalid ©TRKN number tag '"+strNumber+"'"
+                if mp4Meta.trackTotal > 0:
+                    self.metaTrackTotal = mp4Meta.trackTotal
                     if self.metaTrackTotal != album.trackTotal:
                         self.needsRemark = True
                         self.strMetaStatus += f"\n\t\t+ ©TRKN total tag '{strTotal}' differs from CUE tag, priority for '{self.album.trackTotal}'"
                         self.metaTrackTotal = album.trackTotal
                     if len(strNumber) != len(strTotal):
                         self.needsRemark = True
-                        self.strMetaStatus += f"\n\t\t+ imperfect ©TRKN tag '{strTrck}' (different number lengthes)"
+                        self.strMetaStatus += f"\n\t\t+ imperfect ©TRKN tag '{strNumber}/{strTotal}' (different number lengthes)"
                 else:
-                    if strTrck.isnumeric():
-                        self.metaNumber = int(strTrck)
-                    else:
-                        self.needsRemark = True
-                        self.strMetaStatus += "\n\t\t+ invalid ©TRKN tag '"+strNumber+"'"
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ missing ©TRKN (/track total) tag, suggested '{self.album.trackTotal}'"
                     self.metaTrackTotal = self.album.trackTotal
@@ -892,18 +2395,16 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing ©TRKN (track number/track total) tag, suggested track total '{self.album.trackTotal}'"
                 self.metaTrackTotal = self.album.trackTotal
             # MP4 title
-            pos = strTags.find("\xa9nam=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaTitle = strTags[pos+5:end].strip()
+            vals = tags.get("\xa9nam", [])
+            if len(vals) > 0:
+                self.metaTitle = vals[0].strip()
             else:
                 self.needsRemark = True
                 self.strMetaStatus += "\n\t\t+ missing ©NAM (title) tag"
             # MP4 artist
-            pos = strTags.find("\xa9ART=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaArtist = strTags[pos+5:end].strip()
+            vals = tags.get("\xa9ART", [])
+            if len(vals) > 0:
+                self.metaArtist = vals[0].strip()
                 if ensureStringSafety(self.metaArtist) != ensureStringSafety(self.album.artist) and len(self.album.artist) > 0:
                     if self.album.artist.lower() != "various artists":
                         self.needsRemark = True
@@ -915,10 +2416,9 @@ class Track:
                 self.metaArtist = self.album.artist
             # MP4 composer
             if allowComposer:
-                pos = strTags.find("\xa9wrt=")
-                if pos >= 0:
-                    end = strTags.index('\n',pos+5)
-                    self.metaComposer = strTags[pos+5:end].strip()
+                vals = tags.get("\xa9wrt", [])
+                if len(vals) > 0:
+                    self.metaComposer = vals[0].strip()
                     if ensureStringSafety(self.metaComposer) != ensureStringSafety(self.album.composer) and len(self.album.composer) > 0:
                         self.needsRemark = True
                         self.strMetaStatus += f"\n\t\t+ ©WRT (composer) tag '{self.metaComposer}' differs from album's composer, priority for '{self.album.composer}'"
@@ -928,10 +2428,9 @@ class Track:
                     self.strMetaStatus += f"\n\t\t+ missing ©WRT (composer) tag, suggested '{self.album.composer}'"
                     self.metaComposer = self.album.composer
             # MP4 album
-            pos = strTags.find("\xa9alb=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaAlbum = strTags[pos+5:end].strip()
+            vals = tags.get("\xa9alb", [])
+            if len(vals) > 0:
+                self.metaAlbum = vals[0].strip()
                 if ensureStringSafety(self.metaAlbum) != ensureStringSafety(self.album.title) and len(self.album.title) > 0:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ ©ALB (album) tag '{self.metaAlbum}' differs from album's title, priority for '{self.album.title}'"
@@ -941,10 +2440,9 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing ©ALB (album) tag, suggested '{album.title}'"
                 self.metaAlbum = self.album.title
             # MP4 date
-            pos = strTags.find("\xa9day=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                strDate = strTags[pos+5:end].strip()
+            vals = tags.get("\xa9day", [])
+            if len(vals) > 0:
+                strDate = vals[0].strip()
                 if strDate.isnumeric():
                     self.metaDate = int(strDate)
                     if self.metaDate != self.album.year and 0 < self.album.year <= NOW_YEAR:
@@ -960,10 +2458,9 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing ©DAY (year) tag, suggested '{self.album.year:04d}'"
                 self.metaDate = self.album.year
             # MP4 genre
-            pos = strTags.find("\xa9gen=")
-            if pos >= 0:
-                end = strTags.index('\n',pos+5)
-                self.metaGenre = strTags[pos+5:end].strip()
+            vals = tags.get("\xa9gen", [])
+            if len(vals) > 0:
+                self.metaGenre = vals[0].strip()
                 if self.metaGenre != self.album.genre and len(self.album.genre) > 0:
                     self.needsRemark = True
                     self.strMetaStatus += f"\n\t\t+ ©GEN (genre) tag '{self.metaGenre}' differs from CUE tag, priority for '{self.album.genre}'"
@@ -973,18 +2470,10 @@ class Track:
                 self.strMetaStatus += f"\n\t\t+ missing ©GEN (genre) tag, suggested '{self.album.genre}'"
                 self.metaGenre = self.album.genre
             # MP4 cover image
-            pos = strTags.find("covr=[")
-            if pos >= 0:
-                end = strTags.index(']',pos+6)
-                picToks = strTags[pos+6:end].strip().split(' ')
-                tok = ""
-                for i in range(len(picToks)-1, -1, -1):
-                    tok = picToks[i]
-                    if tok.isnumeric():
-                        break
-                picFileSize = int(tok)
+            if len(mp4Meta.pictures) > 0:
+                pic = mp4Meta.pictures[0]
                 if self.album.cover != None:
-                    if not self.album.cover.isOk() or picFileSize != self.album.cover.fileSize:
+                    if not self.album.cover.isEmbeddedIn(self.fullPath, pic):
                         self.needsRemark = True
                         self.renewPicture = True
                         self.strMetaStatus += "\n\t\t+ imperfect COVR (cover image) block"
@@ -999,36 +2488,15 @@ class Track:
             self.needsReplayGain = not skipReplayGain   # Reencoded FLAC will need replay gain by default
             self.deletePadding = True
         else:
-            self.strMetaStatus += f"\n\t\t+ STRANGE audiofile with unknown codec, stats '{stats}'"
-
-        # Find track entry in the cuesheet and check metadata number and title revealed earlier
-        # If cuesheet entry is not found, suggest optimal track number and title from file name, also check file name safety
-        if len(self.album.cueEntries) == self.album.trackTotal and self.album.trackTotal > 0:
-            # Find the best matching cue entry by complex criterion
-            cueBestInd = 0
-            cueBestScore = -1.0e6
-            for cueInd in range(len(album.cueEntries)):
-                cueNum = cueInd + 1
-                cueTit = self.album.cueEntries[cueInd]
-                score = 0
-                if len(self.name) > 0:
-                    score += 5 * similar(self.name.lower(), cueTit.lower())
-                if len(self.metaTitle) > 0:
-                    score += 3 * similar(self.metaTitle, cueTit)
-                if self.number > 0 and not self.name.isascii():
-                    score += -2 * (self.number - cueNum)**2 / 4
-                if self.metaNumber > 0 and 0 == self.number and not self.name.isascii():
-                    score += -1 * (self.metaNumber - cueNum)**2 / 4
-                if score > cueBestScore:
-                    cueBestScore = score
-                    cueBestInd = cueInd
-                # ~ print(cueNum, cueTit, score, self.number, self.metaNumber, self.name, self.metaTitle)
+            self.strMetaStatus += f"\n\t\t+ STRANGE audiofile with unknown codec, stats '{probe.description}'"
+
+    def settle(self, cueIndex):
+        # Check metadata number and title against the cue entry assigned by album ('cueIndex'),
+        # if there is no such entry, suggest optimal track number and title from file name, also check file name safety
+        if cueIndex != None:
             # Compare track number and track title to that determined from cuesheet
-            cueNumber = cueBestInd + 1
-            cueTitle = self.album.cueEntries[cueBestInd]
-            symbList = list(cueTitle)
-            random.shuffle(symbList)
-            self.album.cueEntries[cueBestInd] = '@!%=*/&^'.join(symbList)    # Avoid parasitic coincides in future searches
+            cueNumber = cueIndex + 1
+            cueTitle = self.album.cueEntries[cueIndex]
             self.strStatus = f"\n\t* Track {cueNumber:{self.album.tNumFmt}} '{cueTitle}' File '{self.audioFile}' STATUS: "
             bestName = ensureStringSafety(cueTitle)
             #
@@ -1055,7 +2523,7 @@ class Track:
             # Some cue entries are missing (or missing cuesheet at all)
             bestTitle = coerceTitle(self.name)
             if self.number != self.metaNumber or 0 == self.number:
-                self.number = checkNum
+                self.number = self.checkNum
             #
             bestName = ensureStringSafety(bestTitle)
             self.strStatus = f"\n\t* Track {self.number:{self.album.tNumFmt}} '{bestTitle}' File '{self.audioFile}' STATUS: "
@@ -1109,7 +2577,7 @@ class Track:
 
     def coerce(self):
         print(f"\t* Coercing track {self.metaNumber:{self.album.tNumFmt}} '{self.metaTitle}':", end=" ")
-        if self.isOk():
+        if self.isOk() and 0 == len(self.rgTags):
             print("OK, SKIPPED")
             return
 
@@ -1151,62 +2619,109 @@ class Track:
             print("renamed", end=" ")
 
         # Update metadata if needed
-        if self.needsRemark:
+        if self.needsRemark or len(self.rgTags) > 0:
             if "flac" == self.codec:
-                # Rewrite FLAC metadata
-                proc.call(['metaflac', '--remove-tag=LOG', '--remove-tag=log', '--remove-tag=TRACKNUMBER', '--remove-tag=TRACKTOTAL', \
-                            '--remove-tag=TOTALTRACKS', '--remove-tag=TITLE', '--remove-tag=ARTIST', '--remove-tag=ALBUMARTIST', \
-                            '--remove-tag=ALBUM ARTIST', '--remove-tag=PERFORMER', '--remove-tag=ALBUM', '--remove-tag=GENRE', \
-                            self.fullPath])
-                proc.call(['metaflac',f'--set-tag=TRACKNUMBER={self.metaNumber:{self.album.tNumFmt}}', \
-                            f'--set-tag=TRACKTOTAL={self.metaTrackTotal}', f'--set-tag=TITLE={self.metaTitle}', \
-                            f'--set-tag=ARTIST={self.metaArtist}', f'--set-tag=ALBUM={self.metaAlbum}', \
-                            f'--set-tag=GENRE={self.metaGenre}', self.fullPath])
-                if 0 < self.metaDate <= NOW_YEAR:
-                    proc.call(['metaflac', '--remove-tag=DATE', '--remove-tag=YEAR', self.fullPath])
-                    proc.call(['metaflac', f'--set-tag=DATE={self.metaDate}', self.fullPath])
-                if allowComposer and len(self.metaComposer) > 0:
-                    proc.call(['metaflac', '--remove-tag=COMPOSER', self.fullPath])
-                    proc.call(['metaflac', f'--set-tag=COMPOSER={self.metaComposer}', self.fullPath])
-                print("remarked", end=" ")
+                # Plan all FLAC metadata changes and rewrite the file once
+                flacMeta = readFlacMeta(self.fullPath)
+                if flacMeta is None:
+                    print(f"\nERROR when reading FLAC metadata blocks of '{self.fullPath}', no metadata will be updated")
+                    print("DONE")
+                    return
+                delTags = []
+                newTags = []
+                strDone = ""
+                dropTypes = []
+                if self.needsRemark:
+                    delTags += ["LOG", "TRACKNUMBER", "TRACKTOTAL", "TOTALTRACKS", "TITLE", "ARTIST", "ALBUMARTIST", "ALBUM ARTIST", "PERFORMER", "ALBUM", "GENRE"]
+                    newTags += [("TRACKNUMBER", f"{self.metaNumber:{self.album.tNumFmt}}"), ("TRACKTOTAL", f"{self.metaTrackTotal}"), ("TITLE", self.metaTitle), \
+                                ("ARTIST", self.metaArtist), ("ALBUM", self.metaAlbum), ("GENRE", self.metaGenre)]
+                    if 0 < self.metaDate <= NOW_YEAR:
+                        delTags += ["DATE", "YEAR"]
+                        newTags.append(("DATE", f"{self.metaDate}"))
+                    if allowComposer and len(self.metaComposer) > 0:
+                        delTags.append("COMPOSER")
+                        newTags.append(("COMPOSER", self.metaComposer))
+                    strDone = "remarked"
+                # Replace replay gain tags, padding is dropped just like 'metaflac --dont-use-padding' does
+                if len(self.rgTags) > 0:
+                    newTags += self.rgTags
+                    dropTypes.append(FLAC_PADDING)
+                    strDone += " replaygained"
+                comments = [(name, value) for name, value in flacMeta.comments \
+                            if not (name.upper() in delTags or (len(self.rgTags) > 0 and name.upper().startswith("REPLAYGAIN_")))] + newTags
+                newPictures = []
                 # Manage FLAC picture
                 if self.renewPicture:
                     if self.album.cover != None and self.album.cover.isOk():
-                        proc.call(['metaflac', '--remove', '--block-type=PICTURE', self.fullPath])
-                        proc.call(['metaflac', f'--import-picture-from={self.album.cover.fullPath}', self.fullPath])
-                        self.renewPicture = False
-                        print("repictured", end=" ")
+                        dropTypes.append(FLAC_PICTURE)
+                        newPictures.append(self.album.cover.flacPicture)
+                        strDone += " repictured"
                 # Manage other FLAC blocks
                 if self.deleteApplication:
-                    proc.call(['metaflac', '--remove', '--block-type=APPLICATION', self.fullPath])
-                    self.deleteApplication = False
-                    print("del(FLAC.APPL)", end=" ")
+                    dropTypes.append(FLAC_APPLICATION)
+                    strDone += " del(FLAC.APPL)"
                 if self.deleteSeektable:
-                    proc.call(['metaflac', '--remove', '--block-type=SEEKTABLE', self.fullPath])
-                    self.deleteSeektable = False
-                    print("del(FLAC.SEEK)", end=" ")
+                    dropTypes.append(FLAC_SEEKTABLE)
+                    strDone += " del(FLAC.SEEK)"
                 # Strip FLAC padding
                 if self.deletePadding:
-                    proc.call(['metaflac', '--sort-padding', self.fullPath])
-                    proc.call(['metaflac', '--dont-use-padding', '--remove', '--block-type=PADDING', self.fullPath])
-                    self.deletePadding = False
-                    print("del(FLAC.PADD)", end=" ")
+                    dropTypes.append(FLAC_PADDING)
+                    strDone += " del(FLAC.PADD)"
+                try:
+                    rewriteFlacMeta(self.fullPath, flacMeta, comments, dropTypes, newPictures)
+                except OSError as err:
+                    print(f"\nERROR when rewriting FLAC metadata of '{self.fullPath}': {err}")
+                    print("DONE")
+                    return
+                print(strDone.strip(), end=" ")
+                if len(newPictures) > 0:
+                    self.renewPicture = False
+                if len(self.rgTags) > 0:
+                    self.rgTags = []
+                    self.needsReplayGain = False
+                self.deleteApplication = False
+                self.deleteSeektable = False
+                self.deletePadding = False
                 # Finished with FLAC remarking
                 self.needsRemark = False
-            elif "mp3" == self.codec:
-                # Rewrite MP3 metadata
-                proc.call(['mid3v2', '-T', f'{self.metaNumber:{self.album.tNumFmt}}/{self.metaTrackTotal}', '-t', self.metaTitle, '-a', self.metaArtist, \
-                            '-A', self.metaAlbum, '-y', str(self.metaDate), '-g', self.metaGenre, self.fullPath])
+            elif "mp3" == self.codec and self.needsRemark:
+                # Build the complete new ID3v2.4 tag and write it once
+                id3Meta = readId3Meta(self.fullPath)
+                if len(id3Meta.unsupported) > 0:
+                    print(f"\nWARNING: ID3 tag of '{self.fullPath}' holds frames which cannot be carried over ({', '.join(sorted(set(id3Meta.unsupported)))}), no metadata will be updated")
+                    print("DONE")
+                    return
+                delFrames = ["TRCK", "TIT2", "TPE1", "TALB", "TCON"]
+                newFrames = [("TRCK", f"{self.metaNumber:{self.album.tNumFmt}}/{self.metaTrackTotal}"), ("TIT2", self.metaTitle), \
+                             ("TPE1", self.metaArtist), ("TALB", self.metaAlbum), ("TCON", self.metaGenre)]
+                if self.metaDate > 0:
+                    delFrames.append("TDRC")
+                    newFrames.append(("TDRC", str(self.metaDate)))
                 if allowComposer and len(self.metaComposer) > 0:
-                    proc.call(['mid3v2', '--TCOM', self.metaComposer, self.fullPath])
-                print("remarked", end=" ")
+                    delFrames.append("TCOM")
+                    newFrames.append(("TCOM", self.metaComposer))
+                strDone = "remarked"
+                newPicture = b''
                 # Manage MP3 picture
                 if self.renewPicture:
                     if self.album.cover != None and self.album.cover.isOk():
-                        proc.call(['mid3v2', '--delete-frames=APIC', self.fullPath])
-                        proc.call(['mid3v2', '-p', self.album.cover.fullPath, self.fullPath])
-                        self.renewPicture = False
-                        print("repictured", end=" ")
+                        delFrames.append("APIC")
+                        newPicture = self.album.cover.id3Picture
+                        strDone += " repictured"
+                frames = [(frameId, body) for frameId, body in id3Meta.rawFrames if not frameId in delFrames]
+                frames += [(frameId, b'\x03' + text.encode('utf-8')) for frameId, text in newFrames]    # UTF-8 text frames
+                if len(newPicture) > 0:
+                    frames.append(("APIC", newPicture))
+                newV1 = buildId3v1(self.metaTitle, self.metaArtist, self.metaAlbum, self.metaDate, self.metaNumber, self.metaGenre)
+                try:
+                    writeId3Tag(self.fullPath, id3Meta, frames, newV1)
+                except OSError as err:
+                    print(f"\nERROR when rewriting ID3 tag of '{self.fullPath}': {err}")
+                    print("DONE")
+                    return
+                print(strDone, end=" ")
+                if len(newPicture) > 0:
+                    self.renewPicture = False
                 # Finished with MP3 remarking
                 self.needsRemark = False
             else:
@@ -1267,14 +2782,14 @@ class Album:
             self.genre = albumGenre
 
         # Find cuesheet file
-        albContents = sorted(os.listdir(self.fullPath))
+        listing = listDir(self.fullPath)
+        albContents = listing.names
         cueSize = 0
         for fName in albContents:
-            cuePath = os.path.join(self.fullPath, fName)
-            if isCuesheet(fName) and os.path.isfile(cuePath):
+            if isCuesheet(fName) and listing.isFile(fName):
                 if len(self.cuesheet) > 0:
                     self.manyCues = True
-                    thisCueSize = os.path.getsize(cuePath)
+                    thisCueSize = listing.fileSize(fName)
                     if thisCueSize > cueSize:
                         self.cuesheet = fName
                         cueSize = thisCueSize
@@ -1287,21 +2802,18 @@ class Album:
             if self.manyCues:
                 self.strStatus += "\n\t+ too many cuesheets, priority for '"+self.cuesheet+"'"
 
-            # Read cuesheet file
-            cueFullPath = os.path.join(self.fullPath, self.cuesheet)
-            self.cuetext = loadAndForceUTF8(cueFullPath)
+            # Read and parse cuesheet file
+            cue = loadCueSheet(os.path.join(self.fullPath, self.cuesheet))
+            self.cuetext = cue.text
             if len(self.cuetext) == 0:
                 self.strStatus += f"\n\t+ cuesheet file '{self.cuesheet}' is empty"
             else:
                 # Check album title from cuesheet
                 if 0 == len(self.title):
-                    pos = self.cuetext.find('TITLE ')
-                    if pos < 0:
+                    if not "TITLE" in cue.header:
                         self.strStatus += '\n\t+ missing album TITLE "..." in cuesheet, please add one'
                     else:
-                        end = self.cuetext.index('\n', pos+6)
-                        cueStr = cutCueLine(self.cuetext[pos+6:end])
-                        self.title = coerceTitle(cueStr)
+                        self.title = coerceTitle(cue.header["TITLE"])
                         self.name = ensureStringSafety(self.title)
                         if 0 == len(self.title):
                             self.strStatus += "\n\t+ empty TITLE in cuesheet, please fill it in"
@@ -1310,12 +2822,10 @@ class Album:
 
                 # Check year from cuesheet
                 if 0 == self.year:
-                    pos = self.cuetext.find('REM DATE ')
-                    if pos < 0:
+                    if not "REM DATE" in cue.header:
                         self.strStatus += "\n\t+ missing REM DATE in cuesheet, please add one"
                     else:
-                        end = self.cuetext.index('\n', pos+9)
-                        remDate = cutCueLine(self.cuetext[pos+9:end])
+                        remDate = cue.header["REM DATE"]
                         if not remDate.isnumeric():
                             self.strStatus += "\n\t+ invalid chars '"+remDate+"' after REM DATE in cuesheet"
                         else:
@@ -1324,12 +2834,10 @@ class Album:
 
                 # Extract genre from cuesheet
                 if 0 == len(self.genre):
-                    pos = self.cuetext.find('REM GENRE ')
-                    if pos < 0:
+                    if not "REM GENRE" in cue.header:
                         self.strStatus += '\n\t+ missing REM GENRE "..." in cuesheet, please add one'
                     else:
-                        end = self.cuetext.index('\n', pos+10)
-                        self.genre = cutCueLine(self.cuetext[pos+10:end])
+                        self.genre = cue.header["REM GENRE"]
                         if len(self.genre) == 0:
                             self.strStatus += "\n\t+ empty REM GENRE in cuesheet, please fill it in"
                         else:
@@ -1337,12 +2845,10 @@ class Album:
 
                 # Extract artist from cuesheet
                 if 0 == len(self.artist):
-                    pos = self.cuetext.find('PERFORMER ')
-                    if pos < 0:
+                    if not "PERFORMER" in cue.header:
                         self.strStatus += '\n\t+ missing PERFORMER "..." in cuesheet, please add one'
                     else:
-                        end = self.cuetext.index('\n', pos+10)
-                        self.artist = cutCueLine(self.cuetext[pos+10:end])
+                        self.artist = cue.header["PERFORMER"]
                         if 0 == len(self.artist):
                             self.strStatus += "\n\t+ empty PERFORMER in cuesheet, please fill it in"
                         else:
@@ -1350,22 +2856,18 @@ class Album:
 
                 # Extract composer from cuesheet
                 if allowComposer and 0 == len(self.composer):
-                    pos = self.cuetext.find('REM COMPOSER ')
-                    if pos >= 0:
-                        end = self.cuetext.index('\n', pos+13)
-                        self.composer = cutCueLine(self.cuetext[pos+13:end])
-                        if 0 == len(self.artist):
+                    if "REM COMPOSER" in cue.header:
+                        self.composer = cue.header["REM COMPOSER"]
+                        if 0 == len(self.composer):
                             self.strStatus += "\n\t+ empty REM COMPOSER in cuesheet, please fill it in"
                         else:
                             self.strStatus += f"\n\t+ album composer deduced from cuesheet: '{self.composer}'"
 
                 # Extract tracktotal from cuesheet
-                trackTotalPos = self.cuetext.rfind('TRACK ')
-                if trackTotalPos < 0:
+                if 0 == len(cue.tracks):
                     self.strStatus += '\n\t+ missing TRACKs in cuesheet, please add some'
                 else:
-                    end = self.cuetext.index(' ', trackTotalPos+6)
-                    trackTot = self.cuetext[trackTotalPos+6:end].strip()
+                    trackTot = cue.tracks[-1].strNumber
                     if not trackTot.isnumeric():
                         self.strStatus += "\n\t+ invalid chars '"+trackTot+"' after the last TRACK in cuesheet"
                     else:
@@ -1376,63 +2878,23 @@ class Album:
                             self.trackTotal = cueTrackTotal
 
                 # Build the list of track entries from the cuesheet
-                pos = 0
-                for i in range(self.trackTotal):
-                    pos1 = self.cuetext.find('TRACK ', pos)
-                    if pos1 < 0:
-                        break
-                    pos = pos1+6
-                    end = self.cuetext.find(' ', pos)
-                    trackNo = self.cuetext[pos:end].strip()
-                    if trackNo.isnumeric():
-                        tInd = int(trackNo)
-                        if i+1 != tInd:
-                            self.strStatus += f"\n\t+ suspicious track number '{tInd}' in cuesheet, expected '{i+1}'"
-                    else:
+                cueStrs = []
+                for i, cueTrack in enumerate(cue.tracks[:self.trackTotal]):
+                    if not cueTrack.strNumber.isnumeric():
                         break
-                    pos1 = self.cuetext.find('TITLE ', pos) # Position of track title
-                    pos2 = self.cuetext.find('TRACK ', pos) # Position of the next track
-                    if pos2 < 0:
-                        pos2 = len(self.cuetext)
-                    if pos1 > 0 and pos1 < pos2:
-                        # Proper track 'TITLE ' is detected
-                        pos = pos1+6
-                        pos1 = self.cuetext.find('\n', pos)
-                        if pos1 < 0:
-                            break
-                        cueStr = cutCueLine(self.cuetext[pos:pos1])
-                    else:
+                    if i+1 != cueTrack.number:
+                        self.strStatus += f"\n\t+ suspicious track number '{cueTrack.number}' in cuesheet, expected '{i+1}'"
+                    cueStr = cueTrack.title
+                    if cueStr is None:
                         # Try entry 'FILE "##. Title.*" WAVE' when proper 'TITLE ' is missing
-                        pos1 = self.cuetext.rfind('FILE "', 0, pos)
-                        if pos1 < 0:
-                            break
-                        pos1 += 6
-                        pos2 = self.cuetext.find('" WAVE', pos1)
-                        if pos2 < 0:
+                        cueStr, fileNumber = cueTitleFromFileName(cueTrack.fileName)
+                        if 0 == len(cueStr):
                             break
-                        # Extract number and title from file name
-                        numAndTitle = self.cuetext[pos1:pos2]
-                        namePos = 0
-                        while namePos < len(numAndTitle) and numAndTitle[namePos].isdigit():
-                            namePos += 1
-                        # ~ print("ALB CUE ", numAndTitle, namePos)
-                        if namePos < len(numAndTitle) and (numAndTitle[namePos] in ['.','-',' '] or namePos < len(numAndTitle)/3.0):
-                            trackNo = numAndTitle[:namePos]
-                            cueStr = numAndTitle[namePos:].lstrip()
-                            if cueStr[0] == '.' or cueStr[0] == '-':
-                                cueStr = cueStr[1:].lstrip()
-                            # Cut extension if present
-                            pos1 = cueStr.rfind('.')
-                            if pos1 > 0:
-                                cueStr = cueStr[:pos1].rstrip()
-                            # Check if track number coincides with its index in 'TITLE '
-                            if not (i+1 == tInd and tInd == int(trackNo)):
-                                self.strStatus += f"\n\t+ suspicious track number '{tInd}' in cuesheet, expected '{i+1}'"
-                        else:
-                            self.name = numAndTitle
+                        if fileNumber != None and not (i+1 == cueTrack.number and cueTrack.number == fileNumber):
+                            self.strStatus += f"\n\t+ suspicious track number '{cueTrack.number}' in cuesheet, expected '{i+1}'"
                     # Append cue title to the list of cue entries
-                    trackTitle = coerceTitle(cueStr)
-                    self.cueEntries.append(trackTitle)
+                    cueStrs.append(cueStr)
+                self.cueEntries = coerceTitles(cueStrs)
                 # Check the constructed list of cue entries
                 if len(self.cueEntries) != self.trackTotal:
                     self.strStatus += f"\n\t+ failed to parse all {self.trackTotal} track entries from cuesheet '{self.cuesheet}'. Cuesheet incomplete?"
@@ -1501,7 +2963,7 @@ class Album:
         # Find cover image file
         self.cover = None
         for fName in albContents:
-            if isImageFile(fName) and os.path.isfile(os.path.join(self.fullPath, fName)):
+            if isImageFile(fName) and listing.isFile(fName):
                 img = CoverImage(self.fullPath, fName)
                 if img.isNormal():
                     if self.cover == None:
@@ -1517,7 +2979,7 @@ class Album:
         # Count tracks manually if 'trackTotal' remains unclear
         if 0 == self.trackTotal:
             for fName in albContents:
-                if isAudioFile(fName) and os.path.isfile(os.path.join(self.fullPath, fName)):
+                if isAudioFile(fName) and listing.isFile(fName):
                     self.trackTotal += 1
         # Determine track number format
         strLastNum = str(self.trackTotal)
@@ -1526,16 +2988,34 @@ class Album:
         # Build the collection of tracks
         trackFiles = []
         for fName in albContents:
-            if isAudioFile(fName) and os.path.isfile(os.path.join(self.fullPath, fName)):
+            if isAudioFile(fName) and listing.isFile(fName):
                 trackFiles.append(fName)
         trackFiles.sort()   # Sort the tracks in alphabetical order
 
+        # Read audio files concurrently: by the worker pool when it is at hand (i.e. outside of pool workers), by threads otherwise
+        trackPaths = [os.path.join(self.fullPath, fName) for fName in trackFiles]
+        if workerPool != None and len(trackPaths) > 1:
+            probedTracks = workerPool.map(probeTrackFile, trackPaths)
+        elif len(trackPaths) > 1:
+            # Reading is mostly waiting for disk, so threads overlap well even under GIL
+            with concurrent.futures.ThreadPoolExecutor(max(1, (os.cpu_count() or 1) // numJobs)) as executor:
+                probedTracks = list(executor.map(probeTrackFile, trackPaths))
+        else:
+            probedTracks = [None] * len(trackPaths)
+
         # Instantiate tracks in alphabetical order
         self.tracks = []
         for trackIdx in range(len(trackFiles)):
-            track = Track(self, trackFiles[trackIdx], 1+trackIdx)
+            track = Track(self, trackFiles[trackIdx], 1+trackIdx, probedTracks[trackIdx])
             if track.isNormal():
                 self.tracks.append(track)
+        # Match all the tracks against cuesheet entries at once
+        if len(self.cueEntries) == self.trackTotal and self.trackTotal > 0:
+            cueIndexes = matchCueEntries(self.tracks, self.cueEntries)
+        else:
+            cueIndexes = [None] * len(self.tracks)
+        for track, cueIndex in zip(self.tracks, cueIndexes):
+            track.settle(cueIndex)
         self.trackTotal = len(self.tracks)
         self.needsRecue |= (self.trackTotal != len(self.cueEntries))
 
@@ -1658,6 +3138,22 @@ class Album:
 
         if self.cover != None:
             self.cover.coerce()
+            if any(track.renewPicture for track in self.tracks):
+                self.cover.preparePictures()
+
+        # Measure FLAC replay gain before coercing tracks, so that the tags go into their single metadata rewrite
+        if np != None:
+            rgTracks = [track for track in self.tracks if "flac" == track.codec or ("m4a" == track.codec and track.needsReencode)]
+            if any(track.needsReplayGain for track in rgTracks):
+                # Album gain is only meaningful when all the tracks are measured together
+                print("\t* Measuring FLAC replay gain information:", end=' ')
+                rgTags, report = measureReplayGain([track.fullPath for track in rgTracks])
+                for track, tags in zip(rgTracks, rgTags):
+                    track.rgTags = tags
+                if len(report) == 0:
+                    print("DONE")
+                else:
+                    print(report)
 
         for track in self.tracks:
             track.coerce()
@@ -1671,13 +3167,14 @@ class Album:
                     flacTracks.append(track.fullPath)
                 elif "mp3" == track.codec:
                     mp3Tracks.append(track.fullPath)
-        if len(flacTracks) > 0:
-            print("\t* Updating FLAC replay gain information:", end=' ')
-            res, err = proc.Popen(['metaflac', '--dont-use-padding', '--add-replay-gain'] + flacTracks, stdout=proc.PIPE, stderr=proc.PIPE, text=True).communicate()
-            if len(err) == 0:
-                print("DONE")
-            else:
-                print("\nERROR when adding replay gain into FLAC tracks, metaflac's report reads:\n"+err)
+        if np is None:
+            if len(flacTracks) > 0:
+                print("\t* Updating FLAC replay gain information:", end=' ')
+                res, err = proc.Popen(['metaflac', '--dont-use-padding', '--add-replay-gain'] + flacTracks, stdout=proc.PIPE, stderr=proc.PIPE, text=True).communicate()
+                if len(err) == 0:
+                    print("DONE")
+                else:
+                    print("\nERROR when adding replay gain into FLAC tracks, metaflac's report reads:\n"+err)
         if len(mp3Tracks) > 0:
             print("\t* Updating MP3 replay gain information:", end=' ')
             res, err = proc.Popen(['mp3gain', '-r', '-q', '-c', '-t'] + mp3Tracks, stdout=proc.PIPE, stderr=proc.PIPE, text=True).communicate()
@@ -1714,24 +3211,31 @@ class Album:
             if len(self.genre) > 0:
                 self.cuetext += f'REM GENRE "{self.genre}"\n'
             self.cuetext += f'FILE "{self.goodName}.flac" WAVE\n'
-            index = 0.0
+            index = fractions.Fraction(0)  # Exact position (in seconds) accumulated from sample counts
             for track in self.tracks:   # Loop through all the tracks
                 self.cuetext += f'  TRACK {track.metaNumber:{self.tNumFmt}} AUDIO\n'
                 self.cuetext += f'    TITLE "{track.metaTitle}"\n'
-                idxMin = int(index/60.0)
-                idxSec = int(index - 60*idxMin)
-                idxMs  = int(100*(index - int(index)))
-                self.cuetext += f'    INDEX 01 "{idxMin:02d}:{idxSec:02d}:{idxMs:02d}"\n'
-                strDurSec = os.popen(f'ffprobe -v error -select_streams a:0 -show_entries stream=duration -of default=noprint_wrappers=1:nokey=1 "{track.fullPath}"').read()
-                try:
-                    index += float(strDurSec)
-                except Exception:
-                    pass
+                idxFrames = int(index * 75)    # CD frames, 1/75 sec
+                idxMin = idxFrames // (75*60)
+                idxSec = idxFrames // 75 % 60
+                idxFrm = idxFrames % 75
+                self.cuetext += f'    INDEX 01 "{idxMin:02d}:{idxSec:02d}:{idxFrm:02d}"\n'
+                duration = audioDuration(track.fullPath)
+                if duration != None:
+                    index += fractions.Fraction(duration[0], duration[1])
+                else:
+                    # Fall back to 'ffprobe' for unusual headers
+                    strDurSec = os.popen(f'ffprobe -v error -select_streams a:0 -show_entries stream=duration -of default=noprint_wrappers=1:nokey=1 "{track.fullPath}"').read()
+                    try:
+                        index += fractions.Fraction(strDurSec.strip())
+                    except Exception:
+                        pass
             # Write the reconstructed cuesheet
             cuePath = os.path.join(self.fullPath, self.cuesheet)
             fCue = open(cuePath, "w")
             fCue.write(self.cuetext)
             fCue.close()
+            index = float(index)
             durMin = int(index/60.0)
             durSec = index - durMin*60
             durHrs = int(durMin/60.0)
@@ -1796,7 +3300,7 @@ class UnflatAlbum:
             self.genre = albumGenre
 
         # Find sub-albums
-        contents = os.listdir(self.fullPath)
+        contents = listDir(self.fullPath).dirs
         self.subAlbums = []
         self.subCounts = []
         self.allSubElems = []
@@ -1808,7 +3312,8 @@ class UnflatAlbum:
             if canBeAlbum(fullElem, insideComplex=True):
                 self.subAlbums.append(elem)
                 #
-                subElems = os.listdir(fullElem)
+                subListing = listDir(fullElem)
+                subElems = subListing.names
                 self.allSubElems += subElems
                 self.subCounts.append(len(subElems))
                 #
@@ -1829,14 +3334,15 @@ class UnflatAlbum:
                 self.cueTrackTitles.append(localTracks)
                 self.cueTrackTotals.append(len(localTracks))
                 #
-                localCues = [os.path.join(fullElem,s) for s in subElems if s.lower().endswith(".cue")]
+                localCues = [s for s in subElems if s.lower().endswith(".cue") and subListing.isFile(s)]
                 if 0 == len(localCues):
                     continue
-                bestCue = localCues[0]
-                bestSize = os.path.getsize(bestCue)
+                bestCue = os.path.join(fullElem, localCues[0])
+                bestSize = subListing.fileSize(localCues[0])
                 if len(localCues) > 1:
-                    for cue in localCues[1:]:
-                        cueSize = os.path.getsize(cue)
+                    for s in localCues[1:]:
+                        cue = os.path.join(fullElem, s)
+                        cueSize = subListing.fileSize(s)
                         if cueSize > bestSize:
                             bestCue = cue
                             bestSize = cueSize
@@ -1862,62 +3368,45 @@ class UnflatAlbum:
             self.cueTrackTitles = []    # Construct right now
             self.cueIndexes = []        # Construct right now
             for cueFile in self.cueList:
-                cuetext = loadAndForceUTF8(cueFile)
+                cue = loadCueSheet(cueFile)
                 shortCuePath = os.path.relpath(cueFile, self.fullPath)
-                if len(cuetext) == 0:
+                if len(cue.text) == 0:
                     self.strStatus += f"\n\t+ cuesheet file '{shortCuePath}' is empty"
                 else:
                     # Check album title from cuesheet
-                    pos = cuetext.find('TITLE ')
-                    if pos >= 0:
-                        end = cuetext.index('\n', pos+6)
-                        cueStr = cutCueLine(cuetext[pos+6:end])
-                        if len(cueStr) > 0:
-                            cueTitles.append(coerceTitle(cueStr))
+                    cueStr = cue.header.get("TITLE", "")
+                    if len(cueStr) > 0:
+                        cueTitles.append(coerceTitle(cueStr))
 
                     # Check year from cuesheet
-                    pos = cuetext.find('REM DATE ')
-                    if pos >= 0:
-                        end = cuetext.index('\n', pos+9)
-                        cueStr = cutCueLine(cuetext[pos+9:end])
-                        if cueStr.isnumeric():
-                            cueYear = int(cueStr)
-                            if cueYear > 0 and cueYear <= NOW_YEAR:
-                                cueYears.append(cueYear)
+                    cueStr = cue.header.get("REM DATE", "")
+                    if cueStr.isnumeric():
+                        cueYear = int(cueStr)
+                        if cueYear > 0 and cueYear <= NOW_YEAR:
+                            cueYears.append(cueYear)
 
                     # Extract genre from cuesheet
-                    pos = cuetext.find('REM GENRE ')
-                    if pos >= 0:
-                        end = cuetext.index('\n', pos+10)
-                        cueStr = cutCueLine(cuetext[pos+10:end])
-                        if len(cueStr) > 0:
-                            cueGenres.append(cueStr)
+                    cueStr = cue.header.get("REM GENRE", "")
+                    if len(cueStr) > 0:
+                        cueGenres.append(cueStr)
 
                     # Extract artist from cuesheet
-                    pos = cuetext.find('PERFORMER ')
-                    if pos >= 0:
-                        end = cuetext.index('\n', pos+10)
-                        cueStr = cutCueLine(cuetext[pos+10:end])
-                        if len(cueStr) > 0:
-                            cueArtists.append(cueStr)
+                    cueStr = cue.header.get("PERFORMER", "")
+                    if len(cueStr) > 0:
+                        cueArtists.append(cueStr)
 
                     # Extract composer from cuesheet
                     if allowComposer:
-                        pos = cuetext.find('COMPOSER ')
-                        if pos >= 0:
-                            end = cuetext.index('\n', pos+9)
-                            cueStr = cutCueLine(cuetext[pos+9:end])
-                            if len(cueStr) > 0:
-                                cueComposers.append(cueStr)
+                        cueStr = cue.header.get("REM COMPOSER", cue.header.get("COMPOSER", ""))
+                        if len(cueStr) > 0:
+                            cueComposers.append(cueStr)
 
                     # Extract tracktotal from cuesheet
                     cueTrackTotal = 0
-                    trackTotalPos = cuetext.rfind('TRACK ')
-                    if trackTotalPos < 0:
+                    if 0 == len(cue.tracks):
                         self.strStatus += f"\n\t+ missing TRACKs in cuesheet '{shortCuePath}', please add some"
                     else:
-                        end = cuetext.index(' ', trackTotalPos+6)
-                        trackTot = cuetext[trackTotalPos+6:end].strip()
+                        trackTot = cue.tracks[-1].strNumber
                         if not trackTot.isnumeric():
                             self.strStatus += f"\n\t+ invalid chars '{trackTot}' after the last TRACK in cuesheet '{shortCuePath}'"
                         else:
@@ -1926,101 +3415,33 @@ class UnflatAlbum:
                                 self.strStatus += f"\n\t+ unsupported track number {cueTrackTotal} in cuesheet '{shortCuePath}'"
 
                     # Build the list of track entries and indexes from this cuesheet
-                    pos = 0
-                    cueEntries = []
+                    cueStrs = []
                     cueEntIdxes = []
-                    # print("COMPL ALB CUE ",cueTrackTotal)
-                    for i in range(cueTrackTotal):
-                        # Find the next track
-                        pos1 = cuetext.find('TRACK ', pos)
-                        if pos1 < 0:
-                            break
-                        pos = pos1+6
-                        end = cuetext.find(' ', pos)
-                        # Find track number
-                        trackNo = cuetext[pos:end].strip()
-                        # print("COMPL ALB CUE ",pos1,end,trackNo)
-                        if trackNo.isnumeric():
-                            tInd = int(trackNo)
-                            if i+1 != tInd:
-                                self.strStatus += f"\n\t+ suspicious track number '{tInd}' in cuesheet, expected '{i+1}'"
-                        else:
+                    for i, cueTrack in enumerate(cue.tracks[:cueTrackTotal]):
+                        if not cueTrack.strNumber.isnumeric():
                             break
+                        if i+1 != cueTrack.number:
+                            self.strStatus += f"\n\t+ suspicious track number '{cueTrack.number}' in cuesheet, expected '{i+1}'"
                         # Find track title
-                        pos1Orig = pos1
-                        pos1 = cuetext.find('TITLE ', pos) # Position of track title
-                        pos2 = cuetext.find('TRACK ', pos) # Position of the next track
-                        # print("COMPL ALB CUE ",pos1,pos2)
-                        if pos2 < 0:
-                            pos2 = len(cuetext)
-                        if pos1 > 0 and pos1 < pos2:
-                            # Proper track 'TITLE ' is detected
-                            pos = pos1+6
-                            pos1 = cuetext.find('\n', pos)
-                            if pos1 < 0:
-                                break
-                            cueStr = cutCueLine(cuetext[pos:pos1])
-                        else:
+                        cueStr = cueTrack.title
+                        if cueStr is None:
                             # Try entry 'FILE "##. Title.*" WAVE' when proper 'TITLE ' is missing
-                            pos1 = cuetext.rfind('FILE "', 0, pos)
-                            if pos1 < 0:
+                            cueStr, fileNumber = cueTitleFromFileName(cueTrack.fileName)
+                            if 0 == len(cueStr):
                                 break
-                            pos1 += 6
-                            pos2 = cuetext.find('" WAVE', pos1)
-                            if pos2 < 0:
-                                break
-                            # Extract number and title from file name
-                            numAndTitle = cuetext[pos1:pos2]
-                            namePos = 0
-                            while namePos < len(numAndTitle) and numAndTitle[namePos].isdigit():
-                                namePos += 1
-                            # ~ print("COMPL ALB CUE ", numAndTitle, namePos)
-                            if namePos < len(numAndTitle) and (numAndTitle[namePos] in ['.','-',' '] or namePos < len(numAndTitle)/3.0):
-                                trackNo = numAndTitle[:namePos]
-                                cueStr = numAndTitle[namePos:].lstrip()
-                                if cueStr[0] == '.' or cueStr[0] == '-':
-                                    cueStr = cueStr[1:].lstrip()
-                                # Cut extension if present
-                                pos1 = cueStr.rfind('.')
-                                if pos1 > 0:
-                                    cueStr = cueStr[:pos1].rstrip()
-                                # Check if track number coincides with its index in 'TITLE '
-                                if not (i+1 == tInd and tInd == int(trackNo)):
-                                    self.strStatus += f"\n\t+ suspicious track number '{tInd}' in cuesheet, expected '{i+1}'"
-                            else:
-                                self.name = numAndTitle
-                            # Restore 'pos1' to the current 'TRACK ##'
-                            pos1 = pos1Orig
+                            if fileNumber != None and not (i+1 == cueTrack.number and cueTrack.number == fileNumber):
+                                self.strStatus += f"\n\t+ suspicious track number '{cueTrack.number}' in cuesheet, expected '{i+1}'"
                         # Append cue title to the list of cue entries
-                        trackTitle = coerceTitle(cueStr)
-                        cueEntries.append(trackTitle)
-                        pos = pos1+1
-                        # Find track indexes
-                        posNext = cuetext.find('TRACK ', pos)
-                        if posNext < 0:
-                            posNext = len(cuetext)  # We are working with the last track, so limit it due to file end
-                        entIdxes = []
-                        pos1 = cuetext.find('INDEX 00 ', pos)
-                        if pos1 > 0 and pos1 < posNext:
-                            end = cuetext.find('\n', pos1+9)
-                            if end > pos1:
-                                cueIdx = cuetext[pos1+9:end].lstrip()
-                                if '\r' == cueIdx[-1]:
-                                    cueIdx = cueIdx[:-1].rstrip()
-                                entIdxes.append(cueIdx)
-                        pos1 = cuetext.find('INDEX 01 ', pos)
-                        if pos1 > 0 and pos1 < posNext:
-                            end = cuetext.find('\n', pos1+9)
-                            if end > pos1:
-                                cueIdx = cuetext[pos1+9:end].lstrip()
-                                if '\r' == cueIdx[-1]:
-                                    cueIdx = cueIdx[:-1].rstrip()
-                                entIdxes.append(cueIdx)
+                        cueStrs.append(cueStr)
+                        # Track indexes
+                        entIdxes = [cueTrack.indexes[idx] for idx in [0, 1] if idx in cueTrack.indexes]
                         if 0 == len(entIdxes):
                             cueEntIdxes.append(["00:00:00"])
                         else:
                             cueEntIdxes.append(entIdxes)
 
+                    cueEntries = coerceTitles(cueStrs)
+
                     # Check the list of cue entries
                     if len(cueEntries) != cueTrackTotal:
                         self.strStatus += f"\n\t+ failed to parse all {cueTrackTotal} track entries from cuesheet '{shortCuePath}'. Cuesheet incomplete?"
@@ -2251,14 +3672,50 @@ class UnflatAlbum:
             print(f"\t* album renamed into '{self.goodName}'")
 
 
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+# Parallel analysis
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+def analyseEntry(fullEntry: str):
+    # Runs inside pool workers (forked, so all the settings are inherited), prints nothing
+    if canBeAlbum(fullEntry):
+        if not incremental:
+            return Album(fullEntry)
+        # Skip albums which were OK last time and have not been touched since then
+        fingerprint = albumFingerprint(fullEntry)
+        title = scanCache.loadAlbum(fullEntry, fingerprint)
+        if title != None:
+            return title
+        album = Album(fullEntry)
+        scanCache.storeAlbum(fullEntry, fingerprint if album.isOk() else None, album.title)
+        return album
+    elif canBeComplexAlbum(fullEntry):
+        album = UnflatAlbum(fullEntry)
+        if album.isNormal():
+            return album
+    return None
+
+def coerceAlbum(album):
+    # Runs inside pool workers, album steps keep their order and the report is returned as a whole
+    report = io.StringIO()
+    with contextlib.redirect_stdout(report):
+        try:
+            album.coerce()
+        except Exception as e:
+            print(f"\nERROR when coercing album '{album.goodName}': {e!r}")
+    return report.getvalue()
+
+
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 # Main execution starts here
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 
 
-# 0. Check environment capabilities: 'file', 'ffmpeg', 'ffprobe', 'magick', 'identify', 'metaflac', 'mid3v2' and 'mutagen-inspect' programs
+# 0. Check environment capabilities: 'ffmpeg', 'ffprobe', 'magick', 'mp3gain' programs ('metaflac' without NumPy)
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-PROG_LIST = ['file', 'ffmpeg', 'ffprobe', 'magick', 'identify', 'metaflac', 'mid3v2', 'mutagen-inspect', 'mp3gain']
+PROG_LIST = ['ffmpeg', 'ffprobe', 'magick', 'mp3gain']
+if np is None:
+    PROG_LIST.append('metaflac')
 progsOk = True
 for progName in PROG_LIST:
     resp = proc.Popen(['which', progName], stdout=proc.PIPE, stderr=proc.STDOUT, text=True).communicate()[0]
@@ -2269,7 +3726,7 @@ for progName in PROG_LIST:
         progsOk = False
 if not progsOk:
     print("FATAL: operation impossible without aforementioned utilities")
-    print("For ArchLinux system take a look at 'ffmpeg', 'imagemagick', 'flac', 'python-mutagen' and 'mp3gain' packages")
+    print("For ArchLinux system take a look at 'ffmpeg', 'imagemagick', 'flac' and 'mp3gain' packages (or 'python-numpy' instead of 'flac')")
     sys.exit(-1)
 
 
@@ -2302,6 +3759,12 @@ composerName = ""
 albumTitle = ""
 albumYear = 0
 albumGenre = ""
+numJobs = 1
+workerPool = None
+useCache = True
+rebuildCache = False
+incremental = False
+scanCache = None
 for arg in sys.argv[2:]:
     if arg.startswith("--artist="):
         bandName = arg[9:]
@@ -2320,6 +3783,20 @@ for arg in sys.argv[2:]:
         except:
             print("FATAL: failed to parse the '"+arg+"' option")
             sys.exit(0)
+    elif arg.startswith("--jobs="):
+        try:
+            numJobs = int(arg[7:])
+        except:
+            print("FATAL: failed to parse the '"+arg+"' option")
+            sys.exit(0)
+        if numJobs < 1:
+            numJobs = os.cpu_count() or 1
+    elif arg == "--no-cache":
+        useCache = False
+    elif arg == "--rebuild-cache":
+        rebuildCache = True
+    elif arg == "--incremental":
+        incremental = True
     elif arg == "--coerce":
         dryRun = False
     elif arg == "--no-cap":
@@ -2380,6 +3857,22 @@ elif 0 < albumYear:
     print(f"Defined album year is {albumYear}")
 else:
     print("Preserving year metadata")
+if numJobs > 1:
+    print(f"Running {numJobs} parallel jobs")
+if useCache:
+    # Scan results are cached per file and invalidated by file size and modification time
+    cacheDir = os.environ.get("XDG_CACHE_HOME", "") or os.path.join(os.path.expanduser("~"), ".cache")
+    cachePath = os.path.join(cacheDir, "audite", "scan.sqlite")
+    try:
+        scanCache = ScanCache(cachePath, rebuildCache)
+        print(f"Using scan cache '{cachePath}'" + (" (rebuilt)" if rebuildCache else ""))
+    except (OSError, sqlite3.Error) as e:
+        print(f"WARNING: scan cache '{cachePath}' is unavailable ({e}), scanning from scratch")
+if incremental:
+    if singleAlbum or scanCache is None:
+        print("WARNING: --incremental requires album collection mode and the scan cache")
+        sys.exit(0)
+    print("Only albums changed since the last run will be checked")
 if dryRun:
     print("DRY RUN - nothing will be changed")
 else:
@@ -2392,6 +3885,10 @@ else:
         sys.exit()
 print() # Clear line
 
+# Start worker processes (forked, so that they share all the settings above)
+if numJobs > 1:
+    workerPool = multiprocessing.get_context('fork').Pool(numJobs)
+
 
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 
@@ -2410,23 +3907,28 @@ if not singleAlbum:
         print(f"ERROR: Given directory '{baseDir}' is unlikely to be a collection of albums")
         sys.exit()
     #
-    for entry in os.listdir(baseDir):
-        fullEntry = os.path.join(baseDir, entry)
-        if canBeAlbum(fullEntry):
+    # Albums are analysed concurrently if requested, but reported in sorted order anyway
+    entries = [os.path.join(baseDir, entry) for entry in listDir(baseDir).dirs]
+    if workerPool != None:
+        analysed = workerPool.imap(analyseEntry, entries)
+    else:
+        analysed = map(analyseEntry, entries)
+    for album in analysed:
+        if isinstance(album, str):
+            numAlbums += 1
+            print(f"{numAlbums+numUnflatAlbums:3d}. Flat Album '{album}' STATUS: OK (cached)")
+        elif isinstance(album, Album):
             numAlbums += 1
-            album = Album(fullEntry)
             albums.append(album)
             everythingOk &= album.isOk()
             hasSmthToDo |= album.hasSmthToDo()
             print(f"{numAlbums+numUnflatAlbums:3d}. {album}")
-        elif canBeComplexAlbum(fullEntry):
-            album = UnflatAlbum(fullEntry)
-            if album.isNormal():
-                unflatAlbums.append(album)
-                numUnflatAlbums += 1
-                everythingOk = False
-                hasSmthToDo = True
-                print(f"{numAlbums+numUnflatAlbums:3d}. {album}")
+        elif isinstance(album, UnflatAlbum):
+            unflatAlbums.append(album)
+            numUnflatAlbums += 1
+            everythingOk = False
+            hasSmthToDo = True
+            print(f"{numAlbums+numUnflatAlbums:3d}. {album}")
     # Sort albums
     albums.sort(key = lambda alb: alb.goodName)
     unflatAlbums.sort(key = lambda alb: alb.goodName)
@@ -2478,13 +3980,21 @@ else:
         sys.exit()
     # Coercing
     if not dryRun and hasSmthToDo:
-        nAlb = len(albums)
-        for i, album in enumerate(albums):
-            print(f"[{i+1:02d} / {nAlb:02d}] ", end='')
-            album.coerce()
-        nAlb = len(unflatAlbums)
-        for i, album in enumerate(unflatAlbums):
-            print(f"[{i+1:02d} / {nAlb:02d}] ", end='')
-            album.coerce()
+        if workerPool != None:
+            # Independent albums are coerced concurrently, buffered reports are printed in order
+            reports = workerPool.imap(coerceAlbum, albums + unflatAlbums)
+            for albList in [albums, unflatAlbums]:
+                nAlb = len(albList)
+                for i in range(nAlb):
+                    print(f"[{i+1:02d} / {nAlb:02d}] " + next(reports), end='')
+        else:
+            nAlb = len(albums)
+            for i, album in enumerate(albums):
+                print(f"[{i+1:02d} / {nAlb:02d}] ", end='')
+                album.coerce()
+            nAlb = len(unflatAlbums)
+            for i, album in enumerate(unflatAlbums):
+                print(f"[{i+1:02d} / {nAlb:02d}] ", end='')
+                album.coerce()
         print('\nFINISHED\n'+" ---"*20)
         sys.exit()
@@ -5,10 +5,11 @@ def PrintHelp():
 """
  The Playlister.py script helps to maintain coherence between link-based and m3u-based playlists.
 
- There are 3 usage scenarios:
+ There are 4 usage scenarios:
   1. [links-to-m3u] Transfer a 'folder with links' playlist into an 'm3u' playlist
   2. [m3u-to-links] Expand an 'm3u' playlist into a 'folder with links'
   3. [inspect-list] Scan a 'folder with links' or 'm3u' playlist and convert/sort its entries nicely
+  4. [batch] Synchronize many playlists on the same library at once
   In both scenarious playlists are never truncated, only extended or left as is (if equivalent)
 
  1st scenario [links-to-m3u]:
@@ -32,20 +33,54 @@ def PrintHelp():
  3rd scenario [inspect-list]:
   python Playlister.py --inspect "/path/to/folder/with/links/"      # Convert every link into relative ones and rename as 'Band ∕ Album ∕ ##. Track'
   python Playlister.py --inspect "/path/to/playlist.m3u"            # Sort playlist entries alphabetically
+
+ 4th scenario [batch]:
+  python Playlister.py --batch "path/to/manifest.tsv" "path/to/base/dir/" [--sort-m3u] [--full-links] [--jobs=N]
+   ARG1:   --batch  activates the [batch] regime
+   ARG2:   "path/to/manifest.tsv"   specifies a manifest, one playlist per line (empty lines and '#' comments are skipped):
+                                      path/to/folder/with/links/ <TAB> path/to/playlist.m3u <TAB> alias-for-base-dir: [<TAB> l2m|m2l|sync]
+                                    relative paths are related to the manifest location, 'sync' (default) runs [links-to-m3u]
+                                    and then [m3u-to-links], so that both representations of the playlist get the same entries
+   ARG3:   "path/to/base/dir/"      specifies path to the local base directory shared by all the playlists
+   --sort-m3u, --full-links         same as in 1st and 2nd scenarios, applied to every playlist
+   --jobs=N                         process N independent playlists at once (needs '--yes' or '--rules=FILE')
+  Resolved links and the library index are shared between all the playlists of the manifest.
+
+ Unattended synchronization (1st and 2nd scenarios), options may be placed anywhere:
+   --yes                    do not ask for confirmation of every new entry
+   --rules=FILE             filter new entries by rules instead of asking (implies '--yes'), one rule per line:
+                              include|exclude [artist:|album:|path:]GLOB
+                            globs are case-insensitive and matched against the path relative to base dir (by default),
+                            album folder name or artist folder name, the last matching rule decides, unmatched entries are included
+   --summary=FILE           write machine-readable JSON summary of appended, skipped, duplicate, missing, aborted,
+                            failed and repaired entries into FILE ('-' for standard output, all the other output
+                            including prompts goes to standard error then), every entry is given as the path
+                            of audio file relative to base dir, whatever the direction of synchronization
+
+ Broken links and stale playlist entries (e.g. after tracks or albums were renamed by Audite.py) are looked up
+ by artist, album and track title in the index of the audio library under base dir, and repaired when found.
+ The index is cached in '$XDG_CACHE_HOME/audite/' (or '~/.cache/audite/') and refreshed per changed directory.
 """)
 
 import os
 import sys
 import subprocess as proc
 import functools
+import itertools
+import fnmatch
+import json
+import pickle
+import hashlib
+import threading
+import concurrent.futures
 import random as rnd
 
 print = functools.partial(print, flush=True)
 rnd.seed()
 
-# Check environment capabilities: 'sort' and 'ln' programs
+# Check environment capabilities: 'sort' program
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-PROG_LIST = ['sort', 'ln']
+PROG_LIST = ['sort']
 progsOk = True
 for progName in PROG_LIST:
     resp = proc.Popen(['which', progName], stdout=proc.PIPE, stderr=proc.STDOUT, text=True).communicate()[0]
@@ -61,6 +96,36 @@ if not progsOk:
 # Parse and check command line arguments
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 
+# Extract options of unattended mode, the rest of arguments is positional
+assumeYes = False
+rulesFile = ""
+summaryFile = ""
+numJobs = 1
+posArgs = []
+for arg in sys.argv[1:]:
+    if arg.startswith("--jobs="):
+        try:
+            numJobs = int(arg[7:])
+        except ValueError:
+            numJobs = 0
+        if numJobs < 1:
+            print(f"FATAL: invalid number of jobs '{arg[7:]}'")
+            sys.exit(-1)
+    elif "--yes" == arg:
+        assumeYes = True
+    elif arg.startswith("--rules="):
+        rulesFile = arg[8:]
+        assumeYes = True
+    elif arg.startswith("--summary="):
+        summaryFile = arg[10:]
+    else:
+        posArgs.append(arg)
+sys.argv = sys.argv[:1] + posArgs
+# JSON summary on standard output must be the only thing there, so any other output goes to standard error then
+summaryStream = sys.stdout
+if "-" == summaryFile:
+    sys.stdout = sys.stderr
+
 argc = len(sys.argv)
 if argc >= 1+1:
     if "--help" == sys.argv[1]:
@@ -68,8 +133,28 @@ if argc >= 1+1:
         sys.exit(0)
 
 modeInspect = False
+modeBatch = False
 modeL2M =  False
-if argc == 1+2 and "--inspect" == sys.argv[1]:
+if argc >= 1+3 and "--batch" == sys.argv[1]:
+    modeBatch = True
+    manifestFile = sys.argv[2]
+    baseDir = sys.argv[3]
+    sortM3U = False
+    fullLinks = False
+    for arg in sys.argv[4:]:
+        if "--sort-m3u" == arg:
+            sortM3U = True
+        elif "--full-links" == arg:
+            fullLinks = True
+        else:
+            print("WARNING: invalid argument '"+arg+"'")
+    if not os.path.isfile(manifestFile):
+        print(f"FATAL: manifest '{manifestFile}' not found")
+        sys.exit(0)
+    if not os.path.isdir(baseDir):
+        print(f"FATAL: not a directory '{baseDir}'")
+        sys.exit(0)
+elif argc == 1+2 and "--inspect" == sys.argv[1]:
     modeInspect = True
     if os.path.isdir(sys.argv[2]):
         linkDir = sys.argv[2]
@@ -92,7 +177,6 @@ else:
     extBase = ""
     sortM3U = False
     fullLinks = False
-    sepBslash = False   # Whether external path separator is 'backslash' ('\') character, otherwise forward slash
 
     if modeL2M:
         # links-to-m3u
@@ -100,7 +184,6 @@ else:
         m3uFile = sys.argv[3]
         baseDir = sys.argv[4]
         extBase = sys.argv[5]
-        sepBslash = ('\\' == extBase[-1])   # Detect backslash-like path formatting from external base directory
         if 1+6 == argc:
             sortM3U = (sys.argv[6] == '--sort-m3u')
             if not sortM3U:
@@ -120,24 +203,24 @@ else:
         print(f"FATAL: not a directory '{baseDir}'")
         sys.exit(0)
 
-nOp = 0
-# Read the links from folder if it exists
-linkEntries = []
-if not linkDir is None:
+# Auxiliary functions
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+def ReadLinks(linkDir: str) -> list:
+    # Read the links from folder if it exists, otherwise create the folder
+    linkEntries = []
     if os.path.isdir(linkDir):
-        contents = os.listdir(linkDir)
-        for l in contents:
-            lnk = os.path.join(linkDir, l)
-            if os.path.islink(lnk):
-                linkEntries.append(lnk)
+        with os.scandir(linkDir) as it:
+            for entry in it:
+                if entry.is_symlink():
+                    linkEntries.append(os.path.join(linkDir, entry.name))
     else:
         os.makedirs(linkDir, exist_ok=True)
-    nOp += 1
-    print(f"{nOp}. Read {len(linkEntries)} links from folder '{linkDir}'")
+    return linkEntries
 
-# Read the playlist if it exists
-playEntries = []
-if not m3uFile is None:
+def ReadPlaylist(m3uFile: str) -> list:
+    # Read the playlist if it exists, otherwise create its folder
+    playEntries = []
     if os.path.isfile(m3uFile):
         with open(m3uFile, 'r') as m3u:
             playEntries = m3u.readlines()
@@ -150,13 +233,9 @@ if not m3uFile is None:
             if e1.endswith('\n'):
                 e1 = e1[:-1]
             playEntries[i] = e1
-    else:
+    elif len(os.path.dirname(m3uFile)) > 0:
         os.makedirs(os.path.dirname(m3uFile), exist_ok=True)
-    nOp += 1
-    print(f"{nOp}. Read {len(playEntries)} entries from playlist '{m3uFile}'")
-
-# Auxiliary functions
-# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+    return playEntries
 
 def CutTrackNo(basename: str) -> str:
     name = basename
@@ -190,29 +269,616 @@ def MakeLinkName(audioPath: str) -> str:    # 'audioPath' = real path to real au
     # Construct link name in form 'Artist - Year - Album - Track'
     return artistName + " ∕ " + albumName + " ∕ " + fileName
 
+def FileId(path: str):
+    # Identity of the real file behind 'path' (symlinks are followed), None if there is no such file
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino)
+
+resolvedLinks = {}  # Link path -> path of the audio file it points to (None if broken), shared by all the playlists
+audioFiles = {}     # Audio file path -> its identity (None if there is no such file), shared by all the playlists
+
+def AudioFileId(path: str):
+    if not path in audioFiles:
+        audioFiles[path] = FileId(path) if os.path.isfile(path) else None
+    return audioFiles[path]
+
+def ResolveLink(lnk: str):
+    # Path of the audio file behind the link (either related to working dir or to the link folder), None if broken
+    if not lnk in resolvedLinks:
+        target = os.path.normpath(os.readlink(lnk))
+        tgt1 = os.path.normpath(os.path.join(os.path.dirname(lnk), target))
+        if AudioFileId(target) != None:
+            resolvedLinks[lnk] = target
+        elif AudioFileId(tgt1) != None:
+            resolvedLinks[lnk] = tgt1
+        else:
+            resolvedLinks[lnk] = None
+    return resolvedLinks[lnk]
+
+def FoldsCase(dirPath: str, names: list) -> bool:
+    # Whether the filesystem of 'dirPath' ignores letter case (e.g. vfat or exFAT of a portable player): a case-swapped
+    # spelling of some entry must name the very same entry. Without a suitable entry a probe file is created for a moment
+    names = [name for name in names if name.isascii() and name.swapcase() != name]
+    probePath = ""
+    if len(names) == 0:
+        probePath = os.path.join(dirPath, f".pl-case-{os.getpid()}.tmp")
+        try:
+            open(probePath, 'x').close()
+        except OSError:
+            return False
+        names = [os.path.basename(probePath)]
+    try:
+        return os.path.samestat(os.lstat(os.path.join(dirPath, names[0])), os.lstat(os.path.join(dirPath, names[0].swapcase())))
+    except OSError:
+        return False
+    finally:
+        if len(probePath) > 0:
+            os.remove(probePath)
+
+class PathIndex:
+    # Set of playlist entries or link paths keyed by normalised path, plus reverse index of real files
+
+    def __init__(self, foldCase: bool = False):
+        self.foldCase = foldCase    # Case-insensitive target filesystem
+        self.paths = {}             # Normalised path -> path as given
+        self.files = {}             # (dev, inode) of real file -> path pointing to it
+
+    def Key(self, path: str) -> str:
+        key = path.replace('\\', '/')
+        while "//" in key:
+            key = key.replace("//", "/")
+        if self.foldCase:
+            key = key.casefold()
+        return key
+
+    def Add(self, path: str, fileId = None):
+        self.paths[self.Key(path)] = path
+        if fileId != None:
+            self.files.setdefault(fileId, path)
+
+    def __contains__(self, path: str) -> bool:
+        return self.Key(path) in self.paths
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+tmpCounter = itertools.count()   # Numbers temporary links, unique across pool threads
+
+def MakeRelLink(target: str, lnkPath: str) -> str:
+    # Equivalent of 'ln -srf target lnkPath' without spawning a process: the link is relative to its own
+    # (canonical) directory and replaces an existing one atomically. Returns error message, empty on success
+    lnkDir = os.path.dirname(os.path.abspath(lnkPath))
+    relTarget = os.path.relpath(os.path.realpath(target), os.path.realpath(lnkDir))
+    tmpPath = os.path.join(lnkDir, f".pl-{os.getpid()}-{next(tmpCounter)}.tmp")    # Short, as full link names come close to NAME_MAX
+    try:
+        os.symlink(relTarget, tmpPath)
+        os.replace(tmpPath, lnkPath)
+    except OSError as err:
+        if os.path.islink(tmpPath):
+            os.remove(tmpPath)
+        return str(err)
+    resolvedLinks[lnkPath] = target
+    return ""
+
+def LoadRules(rulesPath: str) -> list:
+    # Parse 'include|exclude [field:]glob' lines into (include, field, glob) triples
+    rules = []
+    with open(rulesPath, 'r') as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            verb, sep, pattern = line.partition(' ')
+            pattern = pattern.strip()
+            field = "path"
+            for prefix in ["artist:", "album:", "path:"]:
+                if pattern.startswith(prefix):
+                    field = prefix[:-1]
+                    pattern = pattern[len(prefix):]
+                    break
+            if not verb in ["include", "exclude"] or len(pattern) == 0:
+                print(f"WARNING: invalid rule at line {n} of '{rulesPath}' ignored: {line}")
+                continue
+            rules.append(("include" == verb, field, pattern.casefold()))
+    return rules
+
+def RulesAllow(relPath: str) -> bool:
+    # Apply rules to the path of audio file relative to base dir (i.e. 'Artist/Album/Track')
+    relPath = relPath.replace('\\', '/')
+    albumPath = os.path.dirname(relPath)
+    fields = {"path": relPath.casefold(), "album": os.path.basename(albumPath).casefold(), \
+              "artist": os.path.basename(os.path.dirname(albumPath)).casefold()}
+    allow = True
+    for include, field, pattern in rules:
+        if fnmatch.fnmatchcase(fields[field], pattern):
+            allow = include
+    return allow
+
+def Confirm(prompt: str) -> bool:
+    if assumeYes:
+        return True
+    return len(input(prompt)) == 0
+
+def MakeReport(mode: str, linkDir: str, m3uFile: str, **entries) -> dict:
+    # Machine-readable report of synchronization, every category is a list of audio file paths relative to base dir
+    # (the paths which broken links or stale playlist entries refer to in case of 'missing')
+    report = {"mode": mode, "playlist": m3uFile, "links": linkDir}
+    for key in ["appended", "skipped", "duplicates", "missing", "aborted", "failed", "repaired"]:
+        report[key] = entries.get(key, [])
+    report["counts"] = {key: len(report[key]) for key in ["appended", "skipped", "duplicates", "missing", "aborted", "failed", "repaired"]}
+    return report
+
+def WriteSummary(report: dict):
+    if len(summaryFile) == 0:
+        return
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if "-" == summaryFile:
+        summaryStream.write(text+'\n')
+        summaryStream.flush()
+    else:
+        with open(summaryFile, 'w') as f:
+            f.write(text+'\n')
+
+AUDIO_EXTS = [".flac", ".m4a", ".mp3"]
+LIBRARY_CACHE_VERSION = 1
+
+def AlbumKey(dirName: str) -> str:
+    # Album folder name without the leading 'YYYY - ' part, which is the usual subject of renames
+    pos = 0
+    while pos < len(dirName) and dirName[pos].isdigit():
+        pos += 1
+    return dirName[pos:].lstrip(" .-").casefold()
+
+def TitleKey(fileName: str) -> str:
+    try:
+        return AudioName(fileName).casefold()
+    except IndexError:
+        return fileName.casefold()  # Name made of track number only
+
+class LibraryIndex:
+    # Audio files under base dir keyed by artist/album/title, directory listings are cached between runs
+    # and reused as long as directory modification time stays the same
+
+    def __init__(self, baseDir: str, cachePath: str = ""):
+        self.baseDir = baseDir
+        self.cachePath = cachePath
+        self.dirs = {}      # Directory path relative to base dir -> (mtime, device, subdirectory names, [(audio file name, inode)])
+        self.byAlbum = {}   # (artist, album, title) -> [(relative path, file identity)]
+        self.numFiles = 0
+
+        # Load cached listings
+        oldDirs = {}
+        if len(self.cachePath) > 0 and os.path.isfile(self.cachePath):
+            try:
+                with open(self.cachePath, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get("version") == LIBRARY_CACHE_VERSION and cached.get("baseDir") == os.path.realpath(baseDir):
+                    oldDirs = cached["dirs"]
+            except Exception:
+                oldDirs = {}
+
+        # Walk the library, only changed directories are listed again
+        stack = [""]
+        while len(stack) > 0:
+            relDir = stack.pop()
+            fullDir = os.path.join(baseDir, relDir)
+            try:
+                st = os.stat(fullDir)
+            except OSError:
+                continue
+            listing = oldDirs.get(relDir)
+            if listing is None or listing[0] != st.st_mtime_ns or listing[1] != st.st_dev:
+                subDirs = []
+                audioFiles = []
+                try:
+                    with os.scandir(fullDir) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                subDirs.append(entry.name)
+                            elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTS and entry.is_file():
+                                audioFiles.append((entry.name, entry.inode()))
+                except OSError:
+                    continue
+                listing = (st.st_mtime_ns, st.st_dev, subDirs, audioFiles)
+            self.dirs[relDir] = listing
+            stack += [os.path.join(relDir, d) for d in listing[2]]
+
+        # Build lookup tables
+        for relDir, (mtime, dev, subDirs, audioFiles) in self.dirs.items():
+            albumDir = os.path.basename(relDir)
+            artist = os.path.basename(os.path.dirname(relDir)).casefold()
+            album = AlbumKey(albumDir)
+            for fileName, inode in audioFiles:
+                item = (os.path.join(relDir, fileName), (dev, inode))
+                title = TitleKey(fileName)
+                self.byAlbum.setdefault((artist, album, title), []).append(item)
+                self.numFiles += 1
+
+        # Save listings for the next run
+        if len(self.cachePath) > 0:
+            try:
+                os.makedirs(os.path.dirname(self.cachePath), exist_ok=True)
+                tmpPath = self.cachePath + f".{os.getpid()}.tmp"
+                with open(tmpPath, 'wb') as f:
+                    pickle.dump({"version": LIBRARY_CACHE_VERSION, "baseDir": os.path.realpath(baseDir), "dirs": self.dirs}, f)
+                os.replace(tmpPath, self.cachePath)
+            except OSError:
+                pass    # Cache is an optimisation only
+
+    def Lookup(self, path: str):
+        # Find the present audio file for a stale 'Artist/Album/##. Title.ext' path, None if not found or ambiguous
+        parts = [p for p in path.replace('\\', '/').split('/') if len(p) > 0]
+        if len(parts) < 3:
+            return None
+        artist, album, title = parts[-3].casefold(), AlbumKey(parts[-2]), TitleKey(parts[-1])
+        # Same title by the same artist on some other album is not taken, that could be another recording
+        items = self.byAlbum.get((artist, album, title), [])
+        if len(items) > 0 and len(set(fileId for relPath, fileId in items)) == 1:
+            found = os.path.join(self.baseDir, items[0][0])
+            if os.path.isfile(found):
+                return found
+        return None
+
+library = None
+libraryLock = threading.Lock()
+
+def GetLibrary() -> LibraryIndex:
+    # Index the library on demand, i.e. only when some broken entries are met, then share it between the playlists
+    global library
+    with libraryLock:
+        if library is None:
+            cacheDir = os.environ.get("XDG_CACHE_HOME", "") or os.path.join(os.path.expanduser("~"), ".cache")
+            baseHash = hashlib.sha1(os.path.realpath(baseDir).encode()).hexdigest()[:16]
+            library = LibraryIndex(baseDir, os.path.join(cacheDir, "audite", f"playlister-library-{baseHash}.pickle"))
+            print(f"\n   indexed {library.numFiles} audio files under '{baseDir}' to repair broken entries")
+    return library
+
 def SortTextFile(filePath: str):
     res, err = proc.Popen(["sort", filePath, "-o", filePath], stdout=proc.PIPE, stderr=proc.PIPE, text=True).communicate()
     if len(err) > 0:
         print("WARNING: 'sort' utility returned error message:"+'\n'+err)
 
+# Synchronization routines
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 
+def ExtPath(extBase: str, relPath: str) -> str:
+    # Playlist entry for the audio file at 'relPath' under base dir, backslash-like formatting follows external base directory
+    extPath = os.path.join(extBase, relPath)
+    if '\\' == extBase[-1]:
+        extPath = extPath.replace('/', '\\')    # Convert separators to backslashes if needed
+    extPath = extPath.replace("//", "/")
+    extPath = extPath.replace("\\\\", "\\")
+    return extPath
+
+def RepairPlaylist(m3uFile: str, playEntries: list, extBase: str) -> list:
+    # Point stale playlist entries to the renamed audio files and rewrite the playlist in place, 'playEntries' are updated too.
+    # Returns base-relative paths of the repaired entries
+    repaired = {}   # Entry number -> new entry
+    extBaseFwd = extBase.replace('\\', '/')
+    for i, e in enumerate(playEntries):
+        relPath = os.path.relpath(e.replace('\\', '/'), extBaseFwd)
+        if len(e) == 0 or relPath.startswith("..") or AudioFileId(os.path.join(baseDir, relPath)) != None:
+            continue
+        found = GetLibrary().Lookup(relPath)
+        if found != None and Confirm(e+"   --->   "+found+" REPAIR: "):
+            repaired[i] = ExtPath(extBase, os.path.relpath(found, baseDir))
+    if len(repaired) == 0:
+        return []
+    # Replace the stale lines keeping their line endings, the playlist is swapped atomically
+    with open(m3uFile, 'r', newline='') as m3u:
+        lines = m3u.readlines()
+    for i, e in repaired.items():
+        lines[i] = e + lines[i][len(lines[i].rstrip('\r\n')):]
+    tmpPath = os.path.join(os.path.dirname(os.path.abspath(m3uFile)), f".pl-{os.getpid()}-{next(tmpCounter)}.tmp")
+    try:
+        with open(tmpPath, 'w', newline='') as m3u:
+            m3u.writelines(lines)
+        os.chmod(tmpPath, os.stat(m3uFile).st_mode & 0o7777)
+        os.replace(tmpPath, m3uFile)
+    except OSError as err:
+        if os.path.isfile(tmpPath):
+            os.remove(tmpPath)
+        print(f"WARNING: failed to rewrite playlist '{m3uFile}': {err}")
+        return []
+    for i, e in repaired.items():
+        playEntries[i] = e
+    print(f"   repaired {len(repaired)} stale playlist entries")
+    return [os.path.relpath(e.replace('\\', '/'), extBaseFwd) for e in repaired.values()]
+
+def SyncLinksToM3U(linkDir: str, m3uFile: str, extBase: str, sortM3U: bool) -> dict:
+    # Append audio files of the links into the playlist, returns report
+    nOp = 0
+    linkEntries = ReadLinks(linkDir)
+    nOp += 1
+    print(f"{nOp}. Read {len(linkEntries)} links from folder '{linkDir}'")
+    playEntries = ReadPlaylist(m3uFile)
+    nOp += 1
+    print(f"{nOp}. Read {len(playEntries)} entries from playlist '{m3uFile}'")
+    if len(linkEntries) == 0:
+        print("Nothing to do, skipping")
+        return MakeReport("l2m", linkDir, m3uFile)
+    sepBslash = ('\\' == extBase[-1])   # Detect backslash-like path formatting from external base directory
+    # Stale entries would otherwise get their renamed files appended next to them
+    repaired = RepairPlaylist(m3uFile, playEntries, extBase)
+
+    # Create the list of healthy resolved links from the folder with links
+    nOp += 1
+    print(f"{nOp}. Resolving the links from '{linkDir}' ...", end=' ')
+    inFiles = []
+    broken = []
+    numRepaired = len(repaired)
+    for l in linkEntries:
+        target = ResolveLink(l)
+        if target != None:
+            inFiles.append(target)
+        else:
+            # Look for the renamed audio file and repoint the link to it
+            found = GetLibrary().Lookup(os.readlink(l))
+            if found != None and Confirm(l+"   --->   "+found+" REPAIR: ") and len(MakeRelLink(found, l)) == 0:
+                inFiles.append(found)
+                repaired.append(os.path.relpath(found, baseDir))
+            else:
+                broken.append(os.path.relpath(os.path.join(os.path.dirname(l), os.readlink(l)), baseDir))
+    print(f"resolved {len(inFiles)} links ({len(repaired)-numRepaired} repaired), ignored {len(broken)} broken ones")
+
+    # Index playlist entries, external devices with backslash separators are treated as case-insensitive
+    playIndex = PathIndex(foldCase=sepBslash)
+    for e in playEntries:
+        playIndex.Add(e)
+
+    # Translate links with reference to the local base directory and append them to 'm3u' playlist
+    appended = []
+    skipped = []
+    duplicates = []
+    aborted = []
+    nOp += 1
+    print(f"{nOp}. Appending {len(inFiles)} links into playlist '{m3uFile}' ...")
+    with open(m3uFile, 'a') as m3u:
+        for f in inFiles:
+            relPath = os.path.relpath(f, baseDir)       # Relate a file to base dir
+            extPath = ExtPath(extBase, relPath)
+            if not extPath in playIndex:
+                if not RulesAllow(relPath):
+                    skipped.append(relPath)
+                    continue
+                if not Confirm(relPath+" ENTER: "):
+                    aborted.append(relPath)
+                    continue
+                m3u.write(extPath+'\r\n')
+                playIndex.Add(extPath)      # Several links to the same file yield a single entry
+                appended.append(relPath)
+            else:
+                duplicates.append(relPath)
+    print(f"   appended {len(appended)} new entries, avoided {len(duplicates)} duplicates, skipped {len(skipped)} by rules, aborted {len(aborted)} exiles")
+    if len(aborted) > 0:
+        print(f"Aborted {len(aborted)} links:")
+        for a in aborted:
+            print(" "+a)
+
+    # Sort M3U playlist if requested
+    if sortM3U:
+        SortTextFile(m3uFile)
+    return MakeReport("l2m", linkDir, m3uFile, appended=appended, skipped=skipped, duplicates=duplicates, missing=broken, aborted=aborted, repaired=repaired)
+
+def SyncM3UToLinks(m3uFile: str, linkDir: str, extBase: str, fullLinks: bool) -> dict:
+    # Create links to audio files of the playlist entries, returns report
+    nOp = 0
+    linkEntries = ReadLinks(linkDir)
+    nOp += 1
+    print(f"{nOp}. Read {len(linkEntries)} links from folder '{linkDir}'")
+    playEntries = ReadPlaylist(m3uFile)
+    nOp += 1
+    print(f"{nOp}. Read {len(playEntries)} entries from playlist '{m3uFile}'")
+    if len(playEntries) == 0:
+        print("Nothing to do, skipping")
+        return MakeReport("m2l", linkDir, m3uFile)
+    repaired = RepairPlaylist(m3uFile, playEntries, extBase)
+    extBase = extBase.replace('\\', '/')    # Playlist entries are converted to forward slashes below
+
+    # Index present links by name and by the real file they point to, case policy follows the filesystem of link folder
+    linkIndex = PathIndex(foldCase=FoldsCase(linkDir, [os.path.basename(l) for l in linkEntries]))
+    for l in linkEntries:
+        target = ResolveLink(l)
+        linkIndex.Add(l, None if target is None else AudioFileId(target))
+    # Translate entries from the 'm3u' playlist into the links at link directory
+    nOp += 1
+    print(f"{nOp}. Converting {len(playEntries)} entries from '{m3uFile}' into local relative links ...")
+    appended = []
+    skipped = []
+    duplicates = []
+    failed = []
+    missed = []
+    aborted = []
+    for e in playEntries:
+        extPath = e.replace('\\', '/')  # Convert backslash separators to forward slashes if any
+        relPath = os.path.relpath(extPath, extBase)
+        locPath = os.path.join(baseDir, relPath)    # Create local path
+        locId = AudioFileId(locPath)
+        if locId != None:
+            fName = os.path.basename(locPath)
+            fName = CutTrackNo(fName)
+            if fullLinks:
+                lnkPath = os.path.join(linkDir, MakeLinkName(relPath))  # Design full link path
+            else:
+                lnkPath = os.path.join(linkDir, fName)  # Design short link path
+            doCreate = False
+            if locId in linkIndex.files:
+                duplicates.append(relPath)  # Do not create duplicate links, some link already points to this very file
+            elif not lnkPath in linkIndex:
+                doCreate = True
+            elif ResolveLink(lnkPath) != None:
+                # The name is taken by a link to another file, we need to rename the new link to differentiate it from an old one
+                if not fullLinks:
+                    # Use Artist and Album names in brakets
+                    tgtDir = os.path.dirname(locPath)
+                    artPath, albName = os.path.split(tgtDir)
+                    artName = os.path.basename(artPath)
+                    postfix = ''
+                    if len(artName) > 0 and not '/' in artName:
+                        postfix = artName+' ∕ '+albName
+                    elif len(albName) > 0 and not '/' in albName:
+                        postfix = albName
+                    if len(postfix) == 0:
+                        postfix = str(rnd.randint(1, 99))
+                    # Modify local link path
+                    postfix = ' ('+postfix+')'
+                    pos = lnkPath.rfind('.')
+                    if pos > 0:
+                        lnkPath = lnkPath[:pos]+postfix+lnkPath[pos:]
+                    else:
+                        lnkPath += postfix
+                # Recheck duplicates again
+                if not lnkPath in linkIndex:
+                    # Create the modified link
+                    doCreate = True
+                elif ResolveLink(lnkPath) != None:
+                    postfix = ' ('+str(rnd.randint(1, 99))+')'
+                    pos = lnkPath.rfind('.')
+                    if pos > 0:
+                        lnkPath = lnkPath[:pos]+postfix+lnkPath[pos:]
+                    else:
+                        lnkPath += postfix
+            # Create the new link if needed
+            if doCreate:
+                if not RulesAllow(relPath):
+                    skipped.append(relPath)
+                    continue
+                if not Confirm(lnkPath+"   --->   "+locPath+" ENTER: "):
+                    aborted.append(relPath)
+                    continue
+                err = MakeRelLink(locPath, lnkPath)
+                if len(err) == 0:
+                    appended.append(relPath)
+                    linkIndex.Add(lnkPath, locId)   # Remember the newly added link
+                else:
+                    print(f"WARNING: failed to create link '{lnkPath}': {err}")
+                    failed.append(relPath)
+        else:
+            missed.append(relPath)
+    print(f"   added {len(appended)} links, skipped {len(duplicates)} duplicates, skipped {len(skipped)} by rules, aborted {len(aborted)} exiles, {len(failed)} failures occured")
+    if len(missed) > 0:
+        print(f"Missing {len(missed)} local entries (present in playlist, though):")
+        for m in missed:
+            print(" "+os.path.join(baseDir, m))
+    if len(aborted) > 0:
+        print(f"Aborted {len(aborted)} entries in playlist:")
+        for a in aborted:
+            print(" "+a)
+    return MakeReport("m2l", linkDir, m3uFile, appended=appended, skipped=skipped, duplicates=duplicates, missing=missed, aborted=aborted, failed=failed, repaired=repaired)
+
+def ReadManifest(manifestPath: str) -> list:
+    # Parse 'linkDir <TAB> m3uFile <TAB> extBase [<TAB> l2m|m2l|sync]' lines, relative paths are related to the manifest
+    manDir = os.path.dirname(manifestPath)
+    playlists = []
+    with open(manifestPath, 'r') as f:
+        for n, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if len(line.strip()) == 0 or line.lstrip().startswith('#'):
+                continue
+            fields = [field.strip() for field in line.split('\t')]
+            if len(fields) == 3:
+                fields.append("sync")
+            if len(fields) != 4 or not fields[3] in ["l2m", "m2l", "sync"] or min(len(field) for field in fields) == 0:
+                print(f"WARNING: invalid manifest line {n} of '{manifestPath}' ignored: {line}")
+                continue
+            linkDir, m3uFile, extBase, direction = fields
+            playlists.append((os.path.join(manDir, linkDir), os.path.join(manDir, m3uFile), extBase, direction))
+    return playlists
+
+def SyncPlaylist(playlist) -> dict:
+    linkDir, m3uFile, extBase, direction = playlist
+    report = {"links": linkDir, "playlist": m3uFile, "direction": direction}
+    if direction in ["l2m", "sync"]:
+        report["l2m"] = SyncLinksToM3U(linkDir, m3uFile, extBase, sortM3U)
+    if direction in ["m2l", "sync"]:
+        report["m2l"] = SyncM3UToLinks(m3uFile, linkDir, extBase, fullLinks)
+    return report
+
+def GroupPlaylists(playlists) -> list:
+    # Playlists sharing a link folder or an M3U file depend on each other and are processed by the same job in given order,
+    # returns lists of (manifest position, playlist) pairs
+    groups = []
+    for i, playlist in enumerate(playlists):
+        keys = {os.path.realpath(playlist[0]), os.path.realpath(playlist[1])}
+        joined = [g for g in groups if len(g[0] & keys) > 0]
+        group = (keys, [])
+        for g in joined:
+            group[0].update(g[0])
+            group[1].extend(g[1])
+            groups.remove(g)
+        group[1].sort()
+        group[1].append((i, playlist))
+        groups.append(group)
+    return [g[1] for g in groups]
+
+class JobOutput:
+    # Standard output which collects text of every pool thread separately, so that playlists are reported as a whole
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            return self.stream.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+def RunPlaylist(playlist) -> dict:
+    # Synchronize a playlist of the manifest, a failure is reported instead of stopping the batch
+    print(f" === Playlist '{playlist[1]}' with links at '{playlist[0]}' ({playlist[3]})")
+    try:
+        return SyncPlaylist(playlist)
+    except Exception as e:
+        print(f"ERROR when synchronizing playlist '{playlist[1]}': {e!r}")
+        return {"links": playlist[0], "playlist": playlist[1], "direction": playlist[3], "error": repr(e)}
+
+def RunJob(group) -> list:
+    # Synchronize a group of dependent playlists within a pool thread, returns (manifest position, report, printed text)
+    results = []
+    for i, playlist in group:
+        sys.stdout.local.buffer = []
+        report = RunPlaylist(playlist)
+        results.append((i, report, ''.join(sys.stdout.local.buffer)))
+        sys.stdout.local.buffer = None
+    return results
+
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+
+# Load filtering rules if given
+rules = []
+if len(rulesFile) > 0:
+    if not os.path.isfile(rulesFile):
+        print(f"FATAL: rules file '{rulesFile}' not found")
+        sys.exit(-1)
+    rules = LoadRules(rulesFile)
+    print(f"Read {len(rules)} rules from '{rulesFile}'")
+
 if modeInspect:
+    nOp = 0
     if not linkDir is None:
         # Convert links into relative ones and rename them as 'Band ∕ Album ∕ ##. Track'
         # --- --- --- --- --- --- --- --- ---
+        linkEntries = ReadLinks(linkDir)
+        nOp += 1
+        print(f"{nOp}. Read {len(linkEntries)} links from folder '{linkDir}'")
         # Resolve existing links
         nOp += 1
         print(f"{nOp}. Resolving the links from '{linkDir}' ...", end=' ')
         inFiles = []
         nBroken = 0
         for l in linkEntries:
-            target = os.path.normpath(os.readlink(l))
-            tgt1 = os.path.normpath(os.path.join(linkDir, target))
-            if os.path.isfile(target):
+            target = ResolveLink(l)
+            if target != None:
                 inFiles.append((target, l))
-            elif os.path.isfile(tgt1):
-                inFiles.append((tgt1, l))
             else:
                 nBroken += 1
         print(f"resolved {len(inFiles)} links, ignored {nBroken} broken ones")
@@ -223,13 +889,13 @@ if modeInspect:
         nErr = 0
         for af, origLink in inFiles:
             lnkPath = os.path.join(linkDir, MakeLinkName(af))   # Design full link path
-            res, err = proc.Popen(["ln", "-srf", af, lnkPath], stdout=proc.PIPE, stderr=proc.PIPE, text=True).communicate()
+            err = MakeRelLink(af, lnkPath)
             if len(err) == 0:
                 nOk += 1
                 if origLink != lnkPath:
                     os.remove(origLink)
             else:
-                print("WARNING: 'ln' utility returned error message:"+'\n'+err)
+                print(f"WARNING: failed to create link '{lnkPath}': {err}")
                 nErr += 1
         print(f"processed {nOk} links successfully, {nErr} failures occured")
 
@@ -237,166 +903,37 @@ if modeInspect:
         # Sort entries in M3U playlist file
         # --- --- --- --- --- --- --- --- ---
         nOp += 1
+        print(f"{nOp}. Read {len(ReadPlaylist(m3uFile))} entries from playlist '{m3uFile}'")
+        nOp += 1
         print(f"{nOp}. Sorting entries in '{m3uFile}'")
         SortTextFile(m3uFile)
+elif modeBatch:
+    # Synchronize every playlist of the manifest, resolved links and library index are shared
+    # --- --- --- --- --- --- --- --- ---
+    playlists = ReadManifest(manifestFile)
+    groups = GroupPlaylists(playlists)
+    print(f"Read {len(playlists)} playlists ({len(groups)} independent groups) from manifest '{manifestFile}'")
+    if numJobs > 1 and not assumeYes:
+        print("WARNING: parallel jobs need '--yes' or '--rules=FILE', processing playlists one by one")
+        numJobs = 1
+    reports = []
+    if numJobs > 1:
+        # Playlists are reported in manifest order once all of them are done
+        sys.stdout = JobOutput(sys.stdout)
+        with concurrent.futures.ThreadPoolExecutor(min(numJobs, max(1, len(groups)))) as pool:
+            results = sorted(r for results in pool.map(RunJob, groups) for r in results)
+        sys.stdout = sys.stdout.stream
+        for i, report, text in results:
+            print(text, end='')
+            reports.append(report)
+    else:
+        for playlist in playlists:
+            reports.append(RunPlaylist(playlist))
+    WriteSummary({"mode": "batch", "baseDir": baseDir, "playlists": reports})
 else:
     # Maintain coherence between playlist and a folder with links
     # --- --- --- --- --- --- --- --- ---
     if modeL2M:
-        if len(linkEntries) == 0:
-            print("Nothing to do, exiting")
-            sys.exit(0)
-        # Create the list of healthy resolved links from the folder with links
-        nOp += 1
-        print(f"{nOp}. Resolving the links from '{linkDir}' ...", end=' ')
-        inFiles = []
-        nBroken = 0
-        for l in linkEntries:
-            target = os.path.normpath(os.readlink(l))
-            tgt1 = os.path.normpath(os.path.join(linkDir, target))
-            if os.path.isfile(target):
-                inFiles.append(target)
-            elif os.path.isfile(tgt1):
-                inFiles.append(tgt1)
-            else:
-                nBroken += 1
-        print(f"resolved {len(inFiles)} links, ignored {nBroken} broken ones")
-
-        # Translate links with reference to the local base directory and append them to 'm3u' playlist
-        aborted = []
-        nOp += 1
-        print(f"{nOp}. Appending {len(inFiles)} links into playlist '{m3uFile}' ...")
-        with open(m3uFile, 'a') as m3u:
-            nApp = 0
-            for f in inFiles:
-                relPath = os.path.relpath(f, baseDir)       # Relate a file to base dir
-                extPath = os.path.join(extBase, relPath)
-                if sepBslash:
-                    extPath = extPath.replace('/', '\\')    # Convert separators to backslashes if needed
-                extPath = extPath.replace("//", "/")
-                extPath = extPath.replace("\\\\", "\\")
-                if not extPath in playEntries:
-                    do = input(relPath+" ENTER: ")
-                    if len(do) > 0:
-                        aborted.append(relPath)
-                        continue
-                    m3u.write(extPath+'\r\n')
-                    nApp += 1
-        print(f"   appended {nApp} new entries, avoided {len(inFiles) - nApp} duplicates, aborted {len(aborted)} exiles")
-        if len(aborted) > 0:
-            print(f"Aborted {len(aborted)} links:")
-            for a in aborted:
-                print(" "+a)
-
-        # Sort M3U playlist if requested
-        if sortM3U:
-            SortTextFile(m3uFile)
-    
+        WriteSummary(SyncLinksToM3U(linkDir, m3uFile, extBase, sortM3U))
     else:
-        if len(playEntries) == 0:
-            print("Nothing to do, exiting")
-            sys.exit(0)
-        # Translate entries from the 'm3u' playlist into the links at link directory
-        nOp += 1
-        print(f"{nOp}. Converting {len(playEntries)} entries from '{m3uFile}' into local relative links ...")
-        nAdd = 0
-        nErr = 0
-        nDup = 0
-        missed = []
-        aborted = []
-        for e in playEntries:
-            extPath = e.replace('\\', '/')  # Convert backslash separators to forward slashes if any
-            relPath = os.path.relpath(extPath, extBase)
-            locPath = os.path.join(baseDir, relPath)    # Create local path
-            if os.path.isfile(locPath):
-                fName = os.path.basename(locPath)
-                fName = CutTrackNo(fName)
-                if fullLinks:
-                    lnkPath = os.path.join(linkDir, MakeLinkName(relPath))  # Design full link path
-                else:
-                    lnkPath = os.path.join(linkDir, fName)  # Design short link path
-                doCreate = False
-                if not lnkPath in linkEntries:
-                    doCreate = True
-                else:
-                    # Possible duplicate, resolve present link and compare destinations
-                    oldDest = os.path.normpath(os.readlink(lnkPath))
-                    isHealthy = True
-                    if not os.path.isfile(oldDest):
-                        oldDest = os.path.normpath(os.path.join(linkDir, oldDest))
-                        isHealthy = os.path.isfile(oldDest)
-                    # Compare destinations
-                    if isHealthy:
-                        if os.path.samefile(oldDest, locPath):
-                            nDup += 1
-                            doCreate = False    # Do not create duplicate links
-                        else:
-                            # We need to rename the new link to differentiate it from an old one
-                            if not fullLinks:
-                                # Use Artist and Album names in brakets
-                                tgtDir = os.path.dirname(locPath)
-                                artPath, albName = os.path.split(tgtDir)
-                                artName = os.path.basename(artPath)
-                                postfix = ''
-                                if len(artName) > 0 and not '/' in artName:
-                                    postfix = artName+' ∕ '+albName
-                                elif len(albName) > 0 and not '/' in albName:
-                                    postfix = albName
-                                if len(postfix) == 0:
-                                    postfix = str(rnd.randint(1, 99))
-                                # Modify local link path
-                                postfix = ' ('+postfix+')'
-                                pos = lnkPath.rfind('.')
-                                if pos > 0:
-                                    lnkPath = lnkPath[:pos]+postfix+lnkPath[pos:]
-                                else:
-                                    lnkPath += postfix
-                            # Recheck duplicates again
-                            if not lnkPath in linkEntries:
-                                # Create the modified link
-                                doCreate = True
-                            else:
-                                # Possible duplicate, resolve present link and compare destinations
-                                oldDest = os.path.normpath(os.readlink(lnkPath))
-                                isHealthy = True
-                                if not os.path.isfile(oldDest):
-                                    oldDest = os.path.normpath(os.path.join(linkDir, oldDest))
-                                    isHealthy = os.path.isfile(oldDest)
-                                # Compare destinations
-                                if isHealthy:
-                                    if os.path.samefile(oldDest, locPath):
-                                        nDup += 1
-                                        doCreate = False    # Do not create duplicate links
-                                    else:
-                                        postfix = ' ('+str(rnd.randint(1, 99))+')'
-                                        pos = lnkPath.rfind('.')
-                                        if pos > 0:
-                                            lnkPath = lnkPath[:pos]+postfix+lnkPath[pos:]
-                                        else:
-                                            lnkPath += postfix
-                # Create the new link if needed
-                if doCreate:
-                    do = input(lnkPath+"   --->   "+locPath+" ENTER: ")
-                    if len(do) > 0:
-                        aborted.append(lnkPath)
-                        continue
-                    # ~ err = ""
-                    res, err = proc.Popen(["ln", "-srf", locPath, lnkPath], stdout=proc.PIPE, stderr=proc.PIPE, text=True).communicate()
-                    if len(err) == 0:
-                        nAdd += 1
-                        linkEntries.append(lnkPath)     # Remember the newly added link
-                    else:
-                        print("WARNING: 'ln' utility returned error message:"+'\n'+err)
-                        nErr += 1
-            else:
-                missed.append(locPath)
-        print(f"   added {nAdd} links, skipped {nDup} duplicates, aborted {len(aborted)} exiles, {nErr} failures occured")
-        if len(missed) > 0:
-            print(f"Missing {len(missed)} local entries (present in playlist, though):")
-            for m in missed:
-                print(" "+m)
-        if len(aborted) > 0:
-            print(f"Aborted {len(aborted)} entries in playlist:")
-            for a in aborted:
-                print(" "+a)
-
+        WriteSummary(SyncM3UToLinks(m3uFile, linkDir, extBase, fullLinks))
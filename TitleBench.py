@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+# Microbenchmark of title normalization in Audite.py: per-title cost of 'coerceTitle' over a synthetic corpus.
+# Usage:
+#   python TitleBench.py [path/to/Audite.py] [--titles=N] [--no-cap]
+# Pass an older Audite.py (e.g. 'git show <commit>:Audite.py > old.py') to compare implementations.
+
+import sys
+import os
+import time
+import random as rnd
+
+auditePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Audite.py")
+numTitles = 20000
+noCaps = False
+for arg in sys.argv[1:]:
+    if arg.startswith("--titles="):
+        numTitles = int(arg[9:])
+    elif "--no-cap" == arg:
+        noCaps = True
+    else:
+        auditePath = arg
+
+# Load the functions of Audite.py without running its main part
+src = open(auditePath).read()
+audite = {"noCaps": noCaps}
+exec(compile(src[:src.index("# Main execution starts here")], auditePath, 'exec'), audite)
+audite["noCaps"] = noCaps
+
+# Synthetic corpus of unique titles mixing major/minor words, abbreviations, punctuation and non-English words
+WORDS = ["love", "of", "the", "night", "in", "a", "dance", "to", "river", "and", "for", "with", "from", "dj", "ii", "feat.", "mix", \
+         "remastered", "version", "live", "at", "on", "ночь", "река", "über", "die", "nacht", "sur", "la", "mer", "it's", "don't"]
+SEPS = [" ", " ", " ", " - ", ": ", " / ", " (", ") "]
+rnd.seed(17)
+titles = set()
+while len(titles) < numTitles:
+    n = rnd.randint(2, 8)
+    title = rnd.choice(WORDS)
+    for i in range(n):
+        title += rnd.choice(SEPS) + rnd.choice(rnd.choice([WORDS, [w.upper() for w in WORDS], [w.capitalize() for w in WORDS]]))
+    titles.add(title.strip())
+titles = sorted(titles)
+
+def TimePass() -> float:
+    t0 = time.perf_counter()
+    for title in titles:
+        audite["coerceTitle"](title)
+    return (time.perf_counter() - t0) / len(titles) * 1e6
+
+normalize = audite.get("normalizeTitle")
+if normalize != None and hasattr(normalize, "cache_clear"):
+    normalize.cache_clear()
+    cold = TimePass()
+    warm = TimePass()
+    print(f"{len(titles)} titles, per title: {cold:.2f} us on a cold cache, {warm:.2f} us on a warm cache")
+else:
+    print(f"{len(titles)} titles, per title: {TimePass():.2f} us (no memoization)")